@@ -0,0 +1,322 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# Copyright (c) 2022, One Identity LLC
+# File: fixtures.py
+# Desc: Synthetic fixtures for the benchmarks, shaped like the output of the
+#       Privilege Manager tools and the facts of a large fleet.
+# Auth: Laszlo Nagy
+# Note: Fixtures are generated from a fixed seed so that runs are comparable.
+# ------------------------------------------------------------------------------
+
+
+# ------------------------------------------------------------------------------
+# Imports
+# ------------------------------------------------------------------------------
+
+import os
+import random
+
+
+# ------------------------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------------------------
+
+SEED = 20221018
+
+# Preflight check descriptions, some of them with commas so that they are
+# quoted in the CSV output
+PREFLIGHT_CHECKS = [
+    'Check hostname',
+    'Check host is not already joined',
+    'Check policy server, port and connectivity',
+    'Check license',
+    'Check PAM configuration',
+    'Check sudo version',
+    'Check "sudoers" syntax',
+    'Check time synchronization',
+    'Check free disk space, /var and /opt',
+    'Check DNS resolution'
+]
+
+# Lines of pmclientinfo -c output
+PMCLIENTINFO_LINES = [
+    'Privilege Manager client version,7.2.0.1',
+    'Host name,{host}',
+    'Joined to a policy group,{joined}',
+    'Hostname of primary policy server,{server}',
+    'Hostname of secondary policy server,{server}b',
+    'Hostname of secondary policy server,{server}c',
+    'Policy mode,sudo',
+    'Policy server port,12345',
+    'License,"Privilege Manager for Sudo, 1000 hosts"',
+    'Client status,ok',
+    'Last policy update,{ts}'
+]
+
+
+# ------------------------------------------------------------------------------
+# Functions
+# ------------------------------------------------------------------------------
+
+# ------------------------------------------------------------------------------
+def new_random():
+    """
+    Returns a random generator with the fixed seed
+    """
+
+    return random.Random(SEED)
+
+
+# ------------------------------------------------------------------------------
+def sudoers_line(rng, i):
+    """
+    Returns one or two (a continued entry) lines of a sudoers file
+    """
+
+    kind = rng.randint(0, 9)
+    n = rng.randint(0, 4999)
+    if kind == 0:
+        return ['# Entry ' + str(i) + ' added for ticket ' + str(n) + '\n']
+    if kind == 1:
+        return ['Defaults:user' + str(n) + ' !requiretty, env_keep += "HOME LANG"\n']
+    if kind == 2:
+        return ['User_Alias UA' + str(i) + ' = user' + str(n) + ', user' + str(n + 1) + ', %group' + str(n % 300) + '\n']
+    if kind == 3:
+        return ['Cmnd_Alias CA' + str(i) + ' = /usr/bin/cmd' + str(n) + ', /usr/sbin/cmd' + str(n + 1) + ' *\n']
+    if kind == 4:
+        return ['%group' + str(n % 300) + ' host' + str(n) + ',host' + str(n + 1) + ' = (ALL : ALL) ALL\n']
+    if kind == 5:
+        return [
+            'user' + str(n) + ' ALL = (root) NOPASSWD: /usr/bin/cmd' + str(n) + ', \\\n',
+            '    /bin/cmd' + str(n + 1) + ', /sbin/service cmd' + str(n) + ' *\n'
+        ]
+    if kind == 6:
+        return ['\n']
+    return ['user' + str(n) + ' ALL = (root) NOPASSWD: /usr/bin/cmd' + str(n) + ', /bin/cmd' + str(n + 1) + '\n']
+
+
+# ------------------------------------------------------------------------------
+def write_sudoers_tree(root, lines, depth=32, dir_files=200):
+    """
+    Writes a sudoers tree of about lines lines below root and returns the path
+    of the main sudoers file.
+
+    The main sudoers file includes a chain of depth files, each including the
+    next one, and an include directory of dir_files files.  The lines are spread
+    evenly over all files.
+    """
+
+    rng = new_random()
+    files = depth + dir_files + 1
+    per_file = max(lines // files, 1)
+    counter = [0]
+
+    def content():
+        out = []
+        while len(out) < per_file:
+            counter[0] += 1
+            out += sudoers_line(rng, counter[0])
+        return out
+
+    include_dir = os.path.join(root, 'sudoers.d')
+    if not os.path.isdir(include_dir):
+        os.makedirs(include_dir)
+
+    main_path = os.path.join(root, 'sudoers')
+    with open(main_path, 'w') as f:
+        f.writelines(content())
+        f.write('@include level1\n')
+        f.write('@includedir ' + include_dir + '\n')
+
+    for level in range(1, depth + 1):
+        with open(os.path.join(root, 'level' + str(level)), 'w') as f:
+            f.writelines(content())
+            if level < depth:
+                f.write('#include level' + str(level + 1) + '\n')
+
+    for n in range(dir_files):
+        with open(os.path.join(include_dir, 'file' + str(n).zfill(4)), 'w') as f:
+            f.writelines(content())
+
+    return main_path
+
+
+# ------------------------------------------------------------------------------
+def pmsrvinfo_output(rows, hosts=5000):
+    """
+    Returns pmsrvinfo -l -c output of rows rows, hosts show up several times
+    with different timestamps
+    """
+
+    rng = new_random()
+    out = []
+    for i in range(rows):
+        host = 'qpm-host' + str(rng.randint(0, hosts - 1))
+        build = str(rng.randint(1, 99))
+        out.append(host + ',/etc/opt/quest/qpm4u/policy/sudoers,7.1.99.' + build +
+            '-55-g' + '%09x' % rng.getrandbits(36) + ',' + str(1634124307 + i) + '\n')
+
+    return ''.join(out)
+
+
+# ------------------------------------------------------------------------------
+def pmjoin_output(lines, errors=5):
+    """
+    Returns verbose pmjoin output of lines lines with errors failure lines
+    """
+
+    rng = new_random()
+    out = []
+    for i in range(lines):
+        kind = rng.randint(0, 9)
+        if kind < 6:
+            out.append('Checking component ' + str(i) + ' ... ok\n')
+        elif kind < 8:
+            out.append('** Configuring setting ' + str(i) + ' = ' + str(rng.randint(0, 999)) + '\n')
+        elif kind < 9:
+            out.append('WARNING: setting ' + str(i) + ' uses its default value\n')
+        else:
+            out.append('\n')
+    for n in range(errors):
+        out.insert(rng.randint(0, len(out)), '** ERROR: step ' + str(n) + ' did not complete\n')
+
+    return ''.join(out)
+
+
+# ------------------------------------------------------------------------------
+def pmclientinfo_outputs(hosts):
+    """
+    Returns the pmclientinfo -c output of hosts hosts, most of them joined
+    """
+
+    rng = new_random()
+    outputs = []
+    for i in range(hosts):
+        joined = rng.randint(0, 9) > 0
+        values = {
+            'host': 'host' + str(i),
+            'joined': 'YES' if joined else 'NO',
+            'server': 'policy' + str(i % 4) if joined else '',
+            'ts': str(1634124307 + i)
+        }
+        outputs.append('\n'.join(line.format(**values) for line in PMCLIENTINFO_LINES) + '\n')
+
+    return outputs
+
+
+# ------------------------------------------------------------------------------
+def preflight_csv(lines, verbose_every=10):
+    """
+    Returns verbose preflight CSV output of lines lines, every verbose_every
+    line is a verbose message rather than a step
+    """
+
+    rng = new_random()
+    out = []
+    for i in range(lines):
+        if i % verbose_every == 0:
+            out.append('Running preflight checks for host' + str(i) + '\n')
+            continue
+        description = PREFLIGHT_CHECKS[i % len(PREFLIGHT_CHECKS)]
+        code = rng.choice((0, 0, 0, 0, 1, 2, 255))
+        message = 'Result of check ' + str(i)
+        if code == 2:
+            message = 'Failed, see "' + description + '" for details'
+        out.append(','.join((
+            str(code),
+            str(1000 + i % len(PREFLIGHT_CHECKS)),
+            csv_field(description),
+            csv_field(message),
+            '')) + '\n')
+
+    return out
+
+
+# ------------------------------------------------------------------------------
+def csv_field(value):
+    """
+    Returns value as a CSV field, quoted if needed
+    """
+
+    if ',' in value or '"' in value:
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+# ------------------------------------------------------------------------------
+def host_fact_list(hosts):
+    """
+    Returns a list of hosts host fact dicts like those collected by the
+    software and join roles
+    """
+
+    rng = new_random()
+    facts = []
+    for i in range(hosts):
+        facts.append({
+            'hostname': 'host' + str(i),
+            'distribution': rng.choice(('RedHat', 'CentOS', 'Ubuntu', 'SLES', 'AIX', 'Solaris')),
+            'distribution_version': str(rng.randint(6, 9)) + '.' + str(rng.randint(0, 9)),
+            'architecture': rng.choice(('x86_64', 'ppc64', 'sparc')),
+            'state': rng.choice(('present', 'present', 'absent', 'check')),
+            'changed': rng.randint(0, 3) == 0,
+            'failed': rng.randint(0, 20) == 0
+        })
+
+    return facts
+
+
+# ------------------------------------------------------------------------------
+def preflight_hostvars(hosts, steps=20):
+    """
+    Returns hostvars of hosts hosts with preflight facts of steps steps each
+    """
+
+    rng = new_random()
+    hostvars = {}
+    for i in range(hosts):
+        host = 'host' + str(i)
+        host_steps = []
+        for n in range(steps):
+            result = rng.choice(('Pass', 'Pass', 'Pass', 'Warning', 'Failure', 'Skipped'))
+            host_steps.append({
+                'code': 0,
+                'check_id': str(1000 + n),
+                'description': PREFLIGHT_CHECKS[n % len(PREFLIGHT_CHECKS)] + ' ' + str(n),
+                'message': 'Message ' + str(rng.randint(0, 20)),
+                'extra': [],
+                'result': result,
+                'duration': round(rng.random(), 3)
+            })
+        hostvars[host] = {
+            'group_names': ['group' + str(i % 10)],
+            'ansible_facts': {
+                'distribution': 'RedHat',
+                'distribution_version': '8.4',
+                'architecture': 'x86_64',
+                'default_ipv4': {'address': '10.0.' + str(i // 256 % 256) + '.' + str(i % 256)},
+                'sas_common': {'failed': False, 'unreachable': False, 'changed': False, 'msg': ''},
+                'sas_preflight_preflight': {
+                    'params': {},
+                    'version': '7.2.0.1',
+                    'duration': round(sum(s['duration'] for s in host_steps), 3),
+                    'cached': False,
+                    'steps': host_steps
+                }
+            }
+        }
+
+    return hostvars
+
+
+# ------------------------------------------------------------------------------
+def package_dict(packages):
+    """
+    Returns a dict of packages packages and their states
+    """
+
+    rng = new_random()
+    return dict(('pkg' + str(i).zfill(6), rng.choice(('absent', 'present', 'check', 'unknown')))
+        for i in range(packages))
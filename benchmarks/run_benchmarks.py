@@ -0,0 +1,410 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# Copyright (c) 2022, One Identity LLC
+# File: run_benchmarks.py
+# Desc: Runs the parsers and filters of the collection against synthetic
+#       fixtures at fleet scale, reports their throughput and peak memory, and
+#       flags regressions against a saved baseline.
+# Auth: Laszlo Nagy
+# Note: Needs ansible-core, but none of the Privilege Manager binaries.
+# ------------------------------------------------------------------------------
+
+
+# ------------------------------------------------------------------------------
+# Imports
+# ------------------------------------------------------------------------------
+
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import fixtures
+
+
+# ------------------------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------------------------
+
+# Collection the benchmarks import
+COLLECTION = 'ansible_collections.oneidentity.privilege_manager'
+
+# Number of timed runs of each benchmark, the fastest one is reported
+REPEAT_DEFAULT = 5
+
+# A benchmark regresses if it is this much slower, or uses this much more
+# memory, than in the baseline
+THRESHOLD_DEFAULT = 0.2
+
+# Peak memory differences below this many KiB are noise, not regressions
+MEMORY_NOISE_KB = 64
+
+# Fixture sizes at scale 1
+SUDOERS_LINES = 100000
+PMSRVINFO_ROWS = 50000
+PMJOIN_LINES = 50000
+PMCLIENTINFO_HOSTS = 10000
+PREFLIGHT_LINES = 200000
+FACT_HOSTS = 10000
+PREFLIGHT_HOSTS = 10000
+PACKAGES = 10000
+
+
+# ------------------------------------------------------------------------------
+# Collection import
+# ------------------------------------------------------------------------------
+
+# ------------------------------------------------------------------------------
+def import_collection(workdir):
+    """
+    Makes the collection importable.  If it is not installed, the repository
+    it is run from is linked into an ansible_collections tree in workdir.
+    """
+
+    try:
+        __import__(COLLECTION + '.plugins.module_utils.process')
+        return
+    except ImportError:
+        pass
+
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    namespace_dir = os.path.join(workdir, 'ansible_collections', 'oneidentity')
+    os.makedirs(namespace_dir)
+    os.symlink(repo, os.path.join(namespace_dir, 'privilege_manager'))
+    sys.path.insert(0, workdir)
+
+
+# ------------------------------------------------------------------------------
+def load(name):
+    """
+    Returns the collection module name, e.g. 'plugins.modules.pmjoin'
+    """
+
+    module = __import__(COLLECTION + '.' + name)
+    for part in (COLLECTION + '.' + name).split('.')[1:]:
+        module = getattr(module, part)
+    return module
+
+
+# ------------------------------------------------------------------------------
+# Benchmarks
+# ------------------------------------------------------------------------------
+#
+# Each benchmark sets up its fixture for a scale and returns the function to
+# time, the number of items and the number of bytes it processes per call.
+
+# ------------------------------------------------------------------------------
+def bench_parse_preflight_steps(scale, workdir):
+    steps = load('plugins.module_utils.preflight_steps')
+    lines = fixtures.preflight_csv(int(PREFLIGHT_LINES * scale))
+    return lambda: steps.parse_preflight_steps(lines), len(lines), sum(len(l) for l in lines)
+
+
+# ------------------------------------------------------------------------------
+def bench_parse_preflight_step(scale, workdir):
+    steps = load('plugins.module_utils.preflight_steps')
+    lines = fixtures.preflight_csv(int(PREFLIGHT_LINES * scale))
+
+    def run():
+        return [steps.parse_preflight_step(line) for line in lines]
+
+    return run, len(lines), sum(len(l) for l in lines)
+
+
+# ------------------------------------------------------------------------------
+def bench_parse_pmjoin_output(scale, workdir):
+    pmjoin = load('plugins.modules.pmjoin')
+    output = fixtures.pmjoin_output(int(PMJOIN_LINES * scale))
+    return lambda: pmjoin.parse_pmjoin_output(output), output.count('\n'), len(output)
+
+
+# ------------------------------------------------------------------------------
+def bench_pmjoin_status_parse(scale, workdir):
+    pmj = load('plugins.module_utils.pmjoin')
+    outputs = fixtures.pmclientinfo_outputs(int(PMCLIENTINFO_HOSTS * scale))
+
+    def run():
+        return [pmj.pmjoin_status_parse(output) for output in outputs]
+
+    return run, len(outputs), sum(len(o) for o in outputs)
+
+
+# ------------------------------------------------------------------------------
+def bench_pmjoin_info_parse(scale, workdir):
+    pmj = load('plugins.module_utils.pmjoin')
+    outputs = fixtures.pmclientinfo_outputs(int(PMCLIENTINFO_HOSTS * scale))
+
+    def run():
+        return [pmj.pmjoin_info_parse(output) for output in outputs]
+
+    return run, len(outputs), sum(len(o) for o in outputs)
+
+
+# ------------------------------------------------------------------------------
+def bench_parse_pmsrvinfo_stdout(scale, workdir):
+    pmsrvinfo = load('plugins.modules.get_sudo_policy_for_unix_host')
+    output = fixtures.pmsrvinfo_output(int(PMSRVINFO_ROWS * scale))
+    return lambda: pmsrvinfo.parse_pmsrvinfo_stdout(output), output.count('\n'), len(output)
+
+
+# ------------------------------------------------------------------------------
+def bench_get_latest_sudo_policies(scale, workdir):
+    pmsrvinfo = load('plugins.modules.get_sudo_policy_for_unix_host')
+    policy_filters = load('plugins.filter.sudo_policy_for_unix_host_filters')
+    output = fixtures.pmsrvinfo_output(int(PMSRVINFO_ROWS * scale))
+    err, policies = pmsrvinfo.parse_pmsrvinfo_stdout(output)
+    return lambda: policy_filters.get_latest_sudo_policies(policies), len(policies), len(output)
+
+
+# ------------------------------------------------------------------------------
+def bench_process_sudoers(scale, workdir, parse=False):
+    get_sudoers = load('plugins.modules.get_sudoers')
+    sudoers = load('plugins.module_utils.sudoers')
+    root = os.path.join(workdir, 'sudoers-parse' if parse else 'sudoers')
+    main_path = fixtures.write_sudoers_tree(root, int(SUDOERS_LINES * scale))
+    lines = 0
+    size = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        for filename in filenames:
+            with open(os.path.join(dirpath, filename), 'rb') as f:
+                data = f.read()
+            lines += data.count(b'\n')
+            size += len(data)
+
+    def run():
+        writer = get_sudoers.SudoersWriter(keep=False)
+        model = sudoers.new_sudoers_model() if parse else None
+        err = get_sudoers.process_sudoers(main_path, [], writer, [], model)
+        if err:
+            raise RuntimeError(err)
+        return writer.close()
+
+    return run, lines, size
+
+
+# ------------------------------------------------------------------------------
+def bench_process_sudoers_parse(scale, workdir):
+    return bench_process_sudoers(scale, workdir, parse=True)
+
+
+# ------------------------------------------------------------------------------
+def bench_dict_list_select(scale, workdir):
+    general_filters = load('plugins.filter.general_filters')
+    facts = fixtures.host_fact_list(int(FACT_HOSTS * scale))
+    keys = ['hostname', 'distribution', 'architecture', 'state', 'failed']
+
+    def run():
+        return general_filters.dict_list_select(
+            facts, keys, include_conditions={'state': 'present'}, exclude_conditions={'failed': True})
+
+    return run, len(facts), 0
+
+
+# ------------------------------------------------------------------------------
+def bench_pkg_dict_2_items(scale, workdir):
+    software_filters = load('plugins.filter.software_filters')
+    packages = fixtures.package_dict(int(PACKAGES * scale))
+
+    # The filter removes the packages from the dict it is given
+    return lambda: software_filters.pkg_dict_2_items(dict(packages)), len(packages), 0
+
+
+# ------------------------------------------------------------------------------
+def bench_preflight_report(scale, workdir):
+    preflight_filters = load('plugins.filter.preflight_filters')
+    hostvars = fixtures.preflight_hostvars(int(PREFLIGHT_HOSTS * scale))
+    hosts = sorted(hostvars)
+    return lambda: preflight_filters.preflight_report(hostvars, hosts), len(hosts), 0
+
+
+# Benchmarks in report order
+BENCHMARKS = [
+    ('parse_preflight_steps', bench_parse_preflight_steps, 'lines'),
+    ('parse_preflight_step', bench_parse_preflight_step, 'lines'),
+    ('parse_pmjoin_output', bench_parse_pmjoin_output, 'lines'),
+    ('pmjoin_status_parse', bench_pmjoin_status_parse, 'hosts'),
+    ('pmjoin_info_parse', bench_pmjoin_info_parse, 'hosts'),
+    ('parse_pmsrvinfo_stdout', bench_parse_pmsrvinfo_stdout, 'rows'),
+    ('get_latest_sudo_policies', bench_get_latest_sudo_policies, 'rows'),
+    ('process_sudoers', bench_process_sudoers, 'lines'),
+    ('process_sudoers_parse', bench_process_sudoers_parse, 'lines'),
+    ('dict_list_select', bench_dict_list_select, 'hosts'),
+    ('pkg_dict_2_items', bench_pkg_dict_2_items, 'packages'),
+    ('preflight_report', bench_preflight_report, 'hosts'),
+]
+
+
+# ------------------------------------------------------------------------------
+# Runner
+# ------------------------------------------------------------------------------
+
+# ------------------------------------------------------------------------------
+def measure(func, repeat):
+    """
+    Returns the fastest of repeat timed calls of func in seconds, and the peak
+    memory allocated by a separate call in KiB.  Memory is traced in its own
+    call because tracing slows the code down.
+    """
+
+    best = None
+    for n in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return best, peak // 1024
+
+
+# ------------------------------------------------------------------------------
+def run_benchmarks(names, scale, repeat, workdir):
+    """
+    Runs the benchmarks names (all if empty) and returns their results
+    """
+
+    results = {}
+    for name, setup, unit in BENCHMARKS:
+        if names and name not in names:
+            continue
+        func, items, size = setup(scale, workdir)
+        seconds, peak_kb = measure(func, repeat)
+        results[name] = {
+            'unit': unit,
+            'items': items,
+            'bytes': size,
+            'seconds': round(seconds, 6),
+            'items_per_second': round(items / seconds, 1) if seconds else 0,
+            'mb_per_second': round(size / seconds / 1e6, 2) if seconds and size else 0,
+            'peak_kb': peak_kb
+        }
+
+    return results
+
+
+# ------------------------------------------------------------------------------
+def compare(results, baseline, threshold):
+    """
+    Returns the regressions of results against baseline, as a dict of
+    benchmark name to a list of messages.  Throughput is compared rather than
+    time, so that baselines taken at another scale remain usable.
+    """
+
+    regressions = {}
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+
+        messages = []
+        if base['items_per_second'] and \
+                result['items_per_second'] < base['items_per_second'] * (1 - threshold):
+            messages.append('throughput %.0f -> %.0f %s/s' % (
+                base['items_per_second'], result['items_per_second'], result['unit']))
+        base_kb_per_item = float(base['peak_kb']) / base['items'] if base['items'] else 0
+        kb_per_item = float(result['peak_kb']) / result['items'] if result['items'] else 0
+        if base_kb_per_item and kb_per_item > base_kb_per_item * (1 + threshold) and \
+                result['peak_kb'] - base_kb_per_item * result['items'] > MEMORY_NOISE_KB:
+            messages.append('peak memory %d -> %d KiB' % (
+                base_kb_per_item * result['items'], result['peak_kb']))
+        if messages:
+            regressions[name] = messages
+
+    return regressions
+
+
+# ------------------------------------------------------------------------------
+def print_results(results, regressions):
+    """
+    Prints a table of results, flagging regressions
+    """
+
+    print('%-26s %10s %-9s %10s %14s %9s %11s  %s' % (
+        'benchmark', 'items', 'unit', 'seconds', 'items/s', 'MB/s', 'peak KiB', 'status'))
+    for name, setup, unit in BENCHMARKS:
+        if name not in results:
+            continue
+        result = results[name]
+        print('%-26s %10d %-9s %10.4f %14.0f %9s %11d  %s' % (
+            name,
+            result['items'],
+            result['unit'],
+            result['seconds'],
+            result['items_per_second'],
+            '%.2f' % result['mb_per_second'] if result['bytes'] else '-',
+            result['peak_kb'],
+            'REGRESSION: ' + ', '.join(regressions[name]) if name in regressions else 'ok'))
+
+
+# ------------------------------------------------------------------------------
+def main():
+    """
+    Main
+    """
+
+    parser = argparse.ArgumentParser(description='Benchmarks of the collection parsers and filters')
+    parser.add_argument('names', nargs='*', metavar='benchmark',
+        help='benchmarks to run, all of them by default: ' + ', '.join(b[0] for b in BENCHMARKS))
+    parser.add_argument('--scale', type=float, default=1.0,
+        help='fixture size relative to fleet scale (default 1.0)')
+    parser.add_argument('--repeat', type=int, default=REPEAT_DEFAULT,
+        help='timed runs of each benchmark, the fastest is reported (default %d)' % REPEAT_DEFAULT)
+    parser.add_argument('--save', metavar='PATH',
+        help='save the results as a baseline')
+    parser.add_argument('--baseline', metavar='PATH',
+        help='flag regressions against a saved baseline, exit with 1 if there are any')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD_DEFAULT,
+        help='slowdown or memory growth flagged as regression (default %.2f)' % THRESHOLD_DEFAULT)
+    args = parser.parse_args()
+
+    unknown = [name for name in args.names if name not in [b[0] for b in BENCHMARKS]]
+    if unknown:
+        parser.error('unknown benchmark: ' + ', '.join(unknown))
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+
+    workdir = tempfile.mkdtemp(prefix='privilege_manager_bench.')
+    try:
+        import_collection(workdir)
+        results = run_benchmarks(args.names, args.scale, args.repeat, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    regressions = compare(results, baseline, args.threshold)
+    print_results(results, regressions)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'scale': args.scale,
+                'results': results
+            }, f, indent=2, sort_keys=True)
+
+    return 1 if regressions else 0
+
+
+# When run from command line
+# ------------------------------------------------------------------------------
+if __name__ == '__main__':
+    sys.exit(main())
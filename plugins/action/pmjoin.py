@@ -0,0 +1,253 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# Copyright (c) 2022, One Identity LLC
+# File: pmjoin.py
+# Desc: Ansible action plugin for pmjoin module that limits the number and the
+#       rate of joins per policy server on the controller, and retries joins
+#       that the module classified as retryable.
+# Auth: Laszlo Nagy
+# Note: Hosts run in separate worker processes, so the limits are kept in lock
+#       files shared by all of them.
+# ------------------------------------------------------------------------------
+
+
+# ------------------------------------------------------------------------------
+# Imports
+# ------------------------------------------------------------------------------
+
+# Future module imports for consistency across Python versions
+from __future__ import absolute_import, division, print_function
+
+# Want classes to be new type for consistency across Python versions
+__metaclass__ = type
+
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import random
+import re
+import time
+
+from ansible.errors import AnsibleActionFail
+from ansible.module_utils.common.text.converters import to_bytes, to_text
+from ansible.plugins.action import ActionBase
+
+
+# ------------------------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------------------------
+
+# Arguments handled here rather than by the module
+CONCURRENCY_DEFAULT = 0
+RATE_DEFAULT = 0.0
+BURST_DEFAULT = 1
+RETRIES_DEFAULT = 0
+RETRY_DELAY_DEFAULT = 5.0
+LOCK_DIR_DEFAULT = '~/.ansible/tmp/pmjoin_limits'
+
+# Longest delay between retries in seconds
+RETRY_DELAY_MAX = 300.0
+
+# Seconds between attempts to get a free join slot
+SLOT_POLL_INTERVAL = 0.2
+
+# ------------------------------------------------------------------------------
+# Helper functions
+# ------------------------------------------------------------------------------
+
+# ------------------------------------------------------------------------------
+def server_key(server):
+    """
+    Returns a lock file name prefix for server
+    """
+
+    name = re.sub(r'[^A-Za-z0-9_.-]', '_', server)[:64]
+    digest = hashlib.sha1(to_bytes(server, errors='surrogate_or_strict')).hexdigest()[:8]
+    return name + '-' + digest
+
+
+# ------------------------------------------------------------------------------
+def acquire_slot(lock_dir, key, concurrency):
+    """
+    Waits for one of the concurrency join slots of key and returns its locked
+    file, closing the file frees the slot.  Slots are exclusive locks on slot
+    files, so the slot of a worker that dies is freed with it.
+    """
+
+    while True:
+        for slot in range(concurrency):
+            slot_file = open(os.path.join(lock_dir, key + '.slot' + str(slot)), 'a')
+            try:
+                fcntl.flock(slot_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return slot_file
+            except (IOError, OSError) as e:
+                slot_file.close()
+                if e.errno not in (errno.EAGAIN, errno.EACCES):
+                    raise
+        time.sleep(SLOT_POLL_INTERVAL * random.uniform(0.5, 1.5))
+
+
+# ------------------------------------------------------------------------------
+def take_token(lock_dir, key, rate, burst):
+    """
+    Waits for a token from the token bucket of key, which holds up to burst
+    tokens and gets rate tokens per second
+    """
+
+    bucket_path = os.path.join(lock_dir, key + '.bucket')
+    while True:
+        with open(bucket_path, 'a+') as bucket_file:
+            fcntl.flock(bucket_file.fileno(), fcntl.LOCK_EX)
+            bucket_file.seek(0)
+            try:
+                bucket = json.loads(bucket_file.read())
+                tokens = float(bucket['tokens'])
+                last = float(bucket['time'])
+            except (ValueError, KeyError, TypeError):
+                tokens = float(burst)
+                last = time.time()
+
+            now = time.time()
+            tokens = min(float(burst), tokens + max(now - last, 0.0) * rate)
+            wait = 0.0
+            if tokens >= 1.0:
+                tokens -= 1.0
+            else:
+                wait = (1.0 - tokens) / rate
+
+            bucket_file.seek(0)
+            bucket_file.truncate()
+            bucket_file.write(json.dumps({'tokens': tokens, 'time': now}))
+
+        if not wait:
+            return
+        time.sleep(wait)
+
+
+# ------------------------------------------------------------------------------
+def is_retryable(module_result):
+    """
+    Returns True if the module failed for a reason worth retrying, the module
+    classifies its failures and flags the timeout, network-unreachable and
+    busy ones as retryable
+    """
+
+    return bool(module_result.get('failed') and module_result.get('retryable'))
+
+
+# ------------------------------------------------------------------------------
+def retry_delay(delay, attempt):
+    """
+    Returns the seconds to wait before retry attempt, doubled with each
+    attempt and jittered so that retries of many hosts do not come in waves
+    """
+
+    delay = min(delay * 2 ** (attempt - 1), RETRY_DELAY_MAX)
+    return random.uniform(delay / 2, delay)
+
+
+# ------------------------------------------------------------------------------
+# Classes
+# ------------------------------------------------------------------------------
+
+# ------------------------------------------------------------------------------
+class ActionModule(ActionBase):
+    """
+    Runs the pmjoin module within the join limits of its policy server
+    """
+
+    TRANSFERS_FILES = False
+
+    def run(self, tmp=None, task_vars=None):
+        result = super(ActionModule, self).run(tmp, task_vars)
+        del tmp
+
+        module_args = self._task.args.copy()
+        try:
+            concurrency = int(module_args.pop('concurrency', None) or CONCURRENCY_DEFAULT)
+            rate = float(module_args.pop('rate', None) or RATE_DEFAULT)
+            burst = max(int(module_args.pop('burst', None) or BURST_DEFAULT), 1)
+            retries = int(module_args.pop('retries', None) or RETRIES_DEFAULT)
+            delay = float(module_args.pop('retry_delay', None) or RETRY_DELAY_DEFAULT)
+        except (TypeError, ValueError) as e:
+            raise AnsibleActionFail('pmjoin join limits must be numbers: ' + to_text(e))
+        lock_dir = os.path.expanduser(module_args.pop('lock_dir', None) or LOCK_DIR_DEFAULT)
+
+        # In check mode pmjoin is not run, so the limits do not apply
+        if self._task.check_mode:
+            concurrency = 0
+            rate = 0.0
+
+        key = server_key(to_text(module_args.get('server') or ''))
+        if concurrency > 0 or rate > 0:
+            try:
+                os.makedirs(lock_dir, 0o700)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise AnsibleActionFail('Could not create pmjoin lock directory ' + lock_dir + ': ' + to_text(e))
+
+        # Hosts that are already in the requested state do not need a join
+        # slot or a token, so check first whether pmjoin would run at all
+        if concurrency > 0 or rate > 0:
+            probe_result = self.probe_module(module_args, task_vars)
+            if not probe_result.get('failed') and not probe_result.get('changed'):
+                result.update(probe_result)
+                result['join_attempts'] = 1
+                result['join_wait'] = 0.0
+                return result
+
+        attempt = 0
+        waited = 0.0
+        while True:
+
+            # Wait for a join slot and a token of the policy server
+            start = time.time()
+            slot_file = acquire_slot(lock_dir, key, concurrency) if concurrency > 0 else None
+            try:
+                if rate > 0:
+                    take_token(lock_dir, key, rate, burst)
+                waited += time.time() - start
+
+                module_result = self._execute_module(
+                    module_name=self._task.action,
+                    module_args=module_args,
+                    task_vars=task_vars)
+            finally:
+                if slot_file is not None:
+                    slot_file.close()
+
+            # Retry failures the module classified as retryable, with backoff.
+            # After pmjoin was stopped part-way, the retry must not take the
+            # host as already joined.
+            if attempt >= retries or not is_retryable(module_result):
+                break
+            if module_result.get('interrupted'):
+                module_args['interrupted'] = True
+            attempt += 1
+            self._display.vvv('pmjoin: retry %d of %d after: %s' % (attempt, retries, module_result.get('msg', '')))
+            time.sleep(retry_delay(delay, attempt))
+
+        result.update(module_result)
+        result['join_attempts'] = attempt + 1
+        result['join_wait'] = round(waited, 3)
+        return result
+
+    def probe_module(self, module_args, task_vars):
+        """
+        Runs the module in check mode, which reports whether pmjoin would run
+        without running it
+        """
+
+        check_mode = self._task.check_mode
+        self._task.check_mode = True
+        try:
+            return self._execute_module(
+                module_name=self._task.action,
+                module_args=module_args.copy(),
+                task_vars=task_vars)
+        finally:
+            self._task.check_mode = check_mode
@@ -0,0 +1,244 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# Copyright (c) 2022, One Identity LLC
+# File: preflight_filters.py
+# Desc: Ansible filters for preflight role
+# Auth: Laszlo Nagy
+# Note:
+# ------------------------------------------------------------------------------
+
+
+# ------------------------------------------------------------------------------
+# Imports
+# ------------------------------------------------------------------------------
+
+# Future module imports for consistency across Python versions
+from __future__ import absolute_import, division, print_function
+
+# Want classes to be new type for consistency across Python versions
+__metaclass__ = type
+
+from ansible.module_utils.common._collections_compat import Mapping
+from ansible.errors import AnsibleFilterError
+from ansible.plugins.filter.core import to_nice_json, to_nice_yaml
+
+
+# ------------------------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------------------------
+
+# Results counted for each check, in report order
+RESULTS = ['Pass', 'Warning', 'Failure', 'Skipped', 'Timeout']
+
+# Results that make preflight fail
+FAILURE_RESULTS = ['Failure', 'Timeout']
+
+# Results for which the hosts of each check are listed
+LISTED_RESULTS = ['Warning', 'Failure', 'Timeout']
+
+# Valid details formats
+DETAILS_FORMATS = ['yaml', 'json']
+
+
+# ------------------------------------------------------------------------------
+# Helper functions
+# ------------------------------------------------------------------------------
+
+# ------------------------------------------------------------------------------
+def preflight_report(hostvars, hosts, facts_key='sas_preflight_preflight', details_format='yaml', top=10):
+    """
+    Builds the data of the preflight reports from the facts of hosts in a
+    single pass, so that the report templates do not have to look up the facts
+    of each host themselves.
+
+    Returns a dict with:
+    - summary: number of hosts, failed, unreachable, changed and cached hosts,
+      and the number of steps with each result
+    - checks: results of each check over all hosts, the checks that failed on
+      the most hosts first
+    - failures: the top failure messages of all checks and the hosts they
+      occurred on, the most frequent first
+    - hosts: a report row for each host, with its details formatted as YAML or
+      JSON
+
+    Example of a check:
+    {
+        'description': 'Check license',
+        'hosts': 3,
+        'results': {'Pass': 1, 'Warning': 0, 'Failure': 2, 'Skipped': 0, 'Timeout': 0},
+        'result_hosts': {'Warning': [], 'Failure': ['host2', 'host3'], 'Timeout': []}
+    }
+    """
+
+    # Make sure hostvars is a mapping
+    if not isinstance(hostvars, Mapping):
+        raise AnsibleFilterError(
+            "preflightreport requires hostvars to be a mapping, got %s instead." % type(hostvars))
+
+    # Make sure hosts is a list
+    if not isinstance(hosts, list):
+        raise AnsibleFilterError(
+            "preflightreport requires hosts to be a list, got %s instead." % type(hosts))
+
+    # Make sure details_format is valid
+    details_format = str(details_format).lower()
+    if details_format not in DETAILS_FORMATS:
+        raise AnsibleFilterError(
+            "preflightreport requires details_format to be one of %s, got %s instead." %
+            (', '.join(DETAILS_FORMATS), details_format))
+
+    summary = {
+        'hosts': 0,
+        'failed': 0,
+        'unreachable': 0,
+        'changed': 0,
+        'cached': 0,
+        'results': dict((result, 0) for result in RESULTS)
+    }
+    checks = {}
+    failures = {}
+    rows = []
+
+    for host in hosts:
+        host_vars = hostvars[host] if host in hostvars else {}
+        row, steps = preflight_report_row(host, host_vars, facts_key, details_format)
+        rows += [row]
+
+        summary['hosts'] += 1
+        for key in ('failed', 'unreachable', 'changed', 'cached'):
+            if row[key]:
+                summary[key] += 1
+
+        for step in steps:
+            description = step.get('description', '')
+            result = str(step.get('result', ''))
+
+            check = checks.get(description)
+            if check is None:
+                check = checks[description] = {
+                    'description': description,
+                    'hosts': 0,
+                    'results': dict((r, 0) for r in RESULTS),
+                    'result_hosts': dict((r, []) for r in LISTED_RESULTS)
+                }
+            check['hosts'] += 1
+            check['results'][result] = check['results'].get(result, 0) + 1
+            if result in check['result_hosts']:
+                check['result_hosts'][result] += [host]
+            summary['results'][result] = summary['results'].get(result, 0) + 1
+
+            if result in FAILURE_RESULTS:
+                failure_key = (description, result, step.get('message', ''))
+                failure = failures.get(failure_key)
+                if failure is None:
+                    failure = failures[failure_key] = {
+                        'description': description,
+                        'result': result,
+                        'message': step.get('message', ''),
+                        'count': 0,
+                        'hosts': []
+                    }
+                failure['count'] += 1
+                failure['hosts'] += [host]
+
+    checks = sorted(checks.values(), key=lambda c: (
+        -sum(c['results'].get(r, 0) for r in FAILURE_RESULTS), -c['results']['Warning'], c['description']))
+    failures = sorted(failures.values(), key=lambda f: (-f['count'], f['description'], f['message']))
+    if top:
+        failures = failures[:int(top)]
+
+    # Return report data ready for the report templates
+    return {
+        'summary': summary,
+        'checks': checks,
+        'failures': failures,
+        'hosts': rows
+    }
+
+
+# ------------------------------------------------------------------------------
+def preflight_report_row(host, host_vars, facts_key, details_format):
+    """
+    Returns the report row and the preflight steps of a host
+    """
+
+    facts = host_vars.get('ansible_facts', {})
+    common = facts.get('sas_common', {})
+    details_raw = facts.get(facts_key) or common or {}
+    steps = details_raw.get('steps') or []
+
+    # System time
+    date_time = facts.get('date_time')
+    sys_time = date_time['date'] + ' ' + date_time['time'] if date_time else ''
+
+    # Timing
+    duration = details_raw.get('duration', '')
+    slowest_check = ''
+    timed_steps = [step for step in steps if 'duration' in step]
+    if timed_steps:
+        slowest = max(timed_steps, key=lambda step: step['duration'])
+        slowest_check = slowest['description'] + ' (' + str(slowest['duration']) + 's)'
+
+    # Profile, only there when the module ran with profile
+    profile = details_raw.get('profile') or {}
+
+    # Details
+    details = {
+        'hostname': host,
+        'msg': common.get('msg', 'Unexpected error occurred'),
+        'unreachable': common.get('unreachable', False),
+        'failed': common.get('failed', True),
+        'changed': common.get('changed', False),
+        'params': details_raw.get('params', {}),
+        'version': details_raw.get('version', ''),
+        'duration': duration,
+        'cached': details_raw.get('cached', False),
+        'steps': steps
+    }
+    if profile:
+        details['profile'] = profile
+    if details_format == 'json':
+        details_str = to_nice_json(details, indent=2)
+    else:
+        details_str = to_nice_yaml(details, indent=2, width=160)
+
+    row = {
+        'hostname': host,
+        'group': ', '.join(host_vars.get('group_names', [])),
+        'ip address': facts.get('default_ipv4', {}).get('address', ''),
+        'os distro': facts.get('distribution', ''),
+        'os version': facts.get('distribution_version', ''),
+        'hw arch': facts.get('architecture', ''),
+        'sys_time': sys_time,
+        'changed': details['changed'],
+        'unreachable': details['unreachable'],
+        'failed': details['failed'],
+        'cached': details['cached'],
+        'duration': duration,
+        'slowest check': slowest_check,
+        'total time': profile.get('total', ''),
+        'subprocess time': profile.get('subprocess', {}).get('wall', ''),
+        'wrapper time': profile.get('wrapper', ''),
+        'details': details_str
+    }
+
+    return row, steps
+
+
+# ------------------------------------------------------------------------------
+# Classes
+# ------------------------------------------------------------------------------
+
+# ------------------------------------------------------------------------------
+class FilterModule(object):
+    """
+    preflight role jinja2 filters
+    """
+
+    def filters(self):
+        filters = {
+            'preflightreport': preflight_report,
+        }
+        return filters
@@ -0,0 +1,93 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# Copyright (c) 2021, One Identity LLC
+# File: sudoers_filters.py
+# Desc: Ansible filters for sudoers role
+# Auth: Laszlo Nagy
+# Note:
+# ------------------------------------------------------------------------------
+
+
+# ------------------------------------------------------------------------------
+# Imports
+# ------------------------------------------------------------------------------
+
+# Future module imports for consistency across Python versions
+from __future__ import absolute_import, division, print_function
+
+# Want classes to be new type for consistency across Python versions
+__metaclass__ = type
+
+from ansible.module_utils.common._collections_compat import Mapping
+from ansible.errors import AnsibleFilterError
+
+
+# ------------------------------------------------------------------------------
+# Helper functions
+# ------------------------------------------------------------------------------
+
+# ------------------------------------------------------------------------------
+def sudoers_records(hostvars, hosts, facts_key='get_sudoers'):
+    """
+    Builds the records of the save_sudoers batch mode from the get_sudoers
+    facts of hosts.  Hosts without a complete sudoers file in their facts
+    (e.g. the ones that were skipped as unchanged) are left out.
+
+    Example of a record:
+    {
+        'host': 'host1',
+        'path': '/etc/sudoers',
+        'content': '...',
+        'encoding': 'zlib',
+        'size': 2048,
+        'digest': '...'
+    }
+    """
+
+    # Make sure hostvars is a mapping
+    if not isinstance(hostvars, Mapping):
+        raise AnsibleFilterError(
+            "sudoersrecords requires hostvars to be a mapping, got %s instead." % type(hostvars))
+
+    # Make sure hosts is a list
+    if not isinstance(hosts, list):
+        raise AnsibleFilterError(
+            "sudoersrecords requires hosts to be a list, got %s instead." % type(hosts))
+
+    records = []
+    for host in hosts:
+        if host not in hostvars:
+            continue
+        facts = hostvars[host].get('ansible_facts', {}).get(facts_key)
+        if not facts or facts.get('unchanged') or 'complete_sudoers' not in facts:
+            continue
+        records += [{
+            'host': host,
+            'path': facts['main_sudoers_path'],
+            'content': facts['complete_sudoers'],
+            'encoding': facts.get('complete_sudoers_encoding', 'none'),
+            'size': facts.get('complete_sudoers_size'),
+            'digest': facts.get('complete_sudoers_digest')
+        }]
+
+    # Return list of records ready for save_sudoers
+    return records
+
+
+# ------------------------------------------------------------------------------
+# Classes
+# ------------------------------------------------------------------------------
+
+# ------------------------------------------------------------------------------
+class FilterModule(object):
+    """
+    sudoers role jinja2 filters
+    """
+
+    def filters(self):
+        filters = {
+            'sudoersrecords': sudoers_records,
+        }
+        return filters
@@ -5,7 +5,8 @@
 # Copyright (c) 2020, One Identity LLC
 # File: check_file_exec.py
 # Desc: Ansible utils module to check executable file permissions and get
-#       its version.
+#       its version.  Versions are memoised by the stat key of the file, and
+#       can be kept in a cache file on the host.
 # Auth: Mark Stillings
 # Note:
 # ------------------------------------------------------------------------------
@@ -15,10 +16,30 @@
 # Imports
 # ------------------------------------------------------------------------------
 
-import sys
 import os
-import subprocess
 import re
+import ansible_collections.oneidentity.privilege_manager.plugins.module_utils.file_cache as file_cache
+import ansible_collections.oneidentity.privilege_manager.plugins.module_utils.process as process
+
+
+# ------------------------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------------------------
+
+# Cache file on the host for file versions, in a directory only the module
+# user can write, as a planted version would be reported as the real one
+VERSION_CACHE_PATH_DEFAULT = file_cache.CACHE_DIR_DEFAULT + '/file_versions_cache.json'
+
+# Seconds a file may run to show its version
+VERSION_TIMEOUT = 30
+
+
+# ------------------------------------------------------------------------------
+# Globals
+# ------------------------------------------------------------------------------
+
+# Versions probed during this module run, by file path and version command
+_versions = {}
 
 
 # ------------------------------------------------------------------------------
@@ -26,9 +47,10 @@ import re
 # ------------------------------------------------------------------------------
 
 # ------------------------------------------------------------------------------
-def check_file_exec(file_path, version_cmd):
+def check_file_exec(file_path, version_cmd, cache_path=None):
     """
-    Check if executable exists, can be executed, and get its version
+    Check if executable exists, can be executed, and get its version.  See
+    get_file_version for cache_path.
     """
 
     # Return values
@@ -48,52 +70,109 @@ def check_file_exec(file_path, version_cmd):
 
     # Get version
     if not err:
-        err, version = get_file_version(file_path, version_cmd)
+        err, version = get_file_version(file_path, version_cmd, cache_path)
 
     # Return
     return err, version
 
 
 # ------------------------------------------------------------------------------
-def get_file_version(file_path, version_cmd):
+def get_file_version(file_path, version_cmd, cache_path=None):
     """
-    Get executable file version
+    Get executable file version.  The file is only run to probe its version
+    once per module run, and if cache_path is given, only once per change of
+    the file: successful probes are kept in cache_path by the stat key
+    (device, inode, size and modification time) of the file.
+    """
+
+    # Return values
+    err = None
+    version = ''
+
+    version_key = file_path + ' ' + version_cmd
+    stat_key = file_cache.stat_key(file_path)
+
+    # Probed during this module run
+    entry = _versions.get(version_key)
+    if stat_key is not None and entry is not None and entry[0] == stat_key:
+        return entry[1], entry[2]
+
+    # Probed during an earlier module run
+    cache = file_cache.load_cache(cache_path) if cache_path else {}
+    entry = cache.get(version_key)
+    if stat_key is not None and isinstance(entry, dict) and entry.get('key') == stat_key and \
+            entry.get('version'):
+        _versions[version_key] = (stat_key, err, entry['version'])
+        return err, entry['version']
+
+    # Probe version
+    err, version = probe_file_version(file_path, version_cmd)
+    if stat_key is not None:
+        _versions[version_key] = (stat_key, err, version)
+
+        # A cache that cannot be written is not an error, the version is just
+        # probed again next time
+        if cache_path and err is None:
+            cache[version_key] = {'key': stat_key, 'version': version}
+            file_cache.save_cache(cache_path, cache)
+
+    # Return
+    return err, version
+
+
+# ------------------------------------------------------------------------------
+def probe_file_version(file_path, version_cmd):
+    """
+    Run executable file to get its version
     """
 
     # Return values
     err = None
     version = None
 
-    # Build vastool command
+    # Build version command
     cmd = []
     cmd += [file_path]
-    cmd += [version_cmd]
+    cmd += [version_cmd] if version_cmd else []
 
     # Exec file to get version
-    try:
-        p = subprocess.Popen(' '.join(cmd), stdin=None, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
-        rval_bytes, rval_err = p.communicate()
-        rval_bytes += rval_err
-    except subprocess.CalledProcessError as e:
-        rval_bytes = e.output
-    # Popen returns list of bytes so we have to decode to get a string
-    rval_str = rval_bytes.decode(sys.stdout.encoding)
+    err, rc, rval_out, rval_err, duration = process.run_process(cmd, timeout=VERSION_TIMEOUT)
+    if err is not None:
+        return err, ''
+    rval_str = rval_out + rval_err
+
+    # Parse version from response
+    version = parse_file_version(rval_str)
+
+    # Check for error
+    if not version:
+        err = 'Could not get version of ' + file_path
+        version = ''
+
+    # Return
+    return err, version
+
+
+# ------------------------------------------------------------------------------
+def parse_file_version(rval_str):
+    """
+    Returns the first version number (e.g. 7.2.0.1) in rval_str, or an empty
+    string if there is none
+    """
+
+    # Return values
+    version = ''
 
     # Compile regex
     vers_re_str = r'(?=.*)[\d]+\.[\d]+\.[\d]+[\.-][\d]+'
     vers_re = re.compile(vers_re_str)
 
-    # Parse version from response
+    # Parse version
     version_match = vers_re.search(rval_str)
     if version_match:
         version_str = version_match.group()
         version_str = version_str.replace('-', '.')
         version = version_str
 
-    # Check for error
-    if not version:
-        err = 'Could not get version of ' + file_path
-        version = ''
-
     # Return
-    return err, version
+    return version
@@ -0,0 +1,145 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# Copyright (c) 2021, One Identity LLC
+# File: file_cache.py
+# Desc: Ansible utils module for small JSON cache files on the host.  Cached
+#       values are validated by the stat key of the file they were derived
+#       from.
+# Auth: Laszlo Nagy
+# Note: Modules trust what they find in a cache, so cache files and their
+#       directories must be owned by the effective user and not writable by
+#       anyone else, otherwise they are ignored.
+# ------------------------------------------------------------------------------
+
+
+# ------------------------------------------------------------------------------
+# Imports
+# ------------------------------------------------------------------------------
+
+import json
+import os
+import stat
+import tempfile
+
+
+# ------------------------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------------------------
+
+# Directory of the cache files, created readable only by the owner
+CACHE_DIR_DEFAULT = '/var/cache/1id'
+
+
+# ------------------------------------------------------------------------------
+# Functions
+# ------------------------------------------------------------------------------
+
+# ------------------------------------------------------------------------------
+def stat_key(path):
+    """
+    Returns the device, inode, size and modification time of path as a list
+    (so that it compares equal to a key loaded from JSON), or None if path
+    cannot be stat'd.  Replacing or modifying the file changes its key.
+    """
+
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+
+    mtime = st.st_mtime_ns if hasattr(st, 'st_mtime_ns') else int(st.st_mtime * 1000000000)
+    return [st.st_dev, st.st_ino, st.st_size, mtime]
+
+
+# ------------------------------------------------------------------------------
+def is_private(st):
+    """
+    Returns True if the file with stat result st is owned by the effective user
+    and not writable by group or others
+    """
+
+    return st.st_uid == os.geteuid() and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+# ------------------------------------------------------------------------------
+def is_private_dir(cache_dir):
+    """
+    Returns True if cache_dir is a directory (not a symlink) that is private,
+    see is_private()
+    """
+
+    try:
+        st = os.lstat(cache_dir if cache_dir else '.')
+    except OSError:
+        return False
+
+    return stat.S_ISDIR(st.st_mode) and is_private(st)
+
+
+# ------------------------------------------------------------------------------
+def load_cache(cache_path):
+    """
+    Returns the dict stored in cache_path, or an empty dict if there is no
+    cache file, it cannot be read, or it or its directory is not private (see
+    is_private()), as anyone who can write it could plant values in it
+    """
+
+    if not cache_path:
+        return {}
+
+    if not is_private_dir(os.path.dirname(cache_path)):
+        return {}
+
+    try:
+        fd = os.open(cache_path, os.O_RDONLY | getattr(os, 'O_NOFOLLOW', 0))
+        f = os.fdopen(fd, 'r')
+        try:
+            st = os.fstat(f.fileno())
+            if not stat.S_ISREG(st.st_mode) or not is_private(st):
+                return {}
+            data = json.load(f)
+        finally:
+            f.close()
+    except (IOError, OSError, ValueError):
+        return {}
+
+    return data if isinstance(data, dict) else {}
+
+
+# ------------------------------------------------------------------------------
+def save_cache(cache_path, data):
+    """
+    Stores the dict data in cache_path, readable only by the owner.  The data
+    is written to a temporary file which then replaces cache_path so that
+    concurrent readers never see a partial cache file.  A missing directory is
+    created readable only by the owner, an existing one must be private (see
+    is_private()).  Returns None or a string describing the error.
+    """
+
+    if not cache_path:
+        return None
+
+    tmp_path = None
+    try:
+        cache_dir = os.path.dirname(cache_path)
+        if cache_dir and not os.path.lexists(cache_dir):
+            os.makedirs(cache_dir, 0o700)
+        if not is_private_dir(cache_dir):
+            return 'Cannot write cache file ' + cache_path + ': directory is not private'
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir if cache_dir else None,
+            prefix='.' + os.path.basename(cache_path) + '.')
+        f = os.fdopen(fd, 'w')
+        try:
+            json.dump(data, f, sort_keys=True)
+        finally:
+            f.close()
+        os.rename(tmp_path, cache_path)
+
+    except (IOError, OSError) as e:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return 'Cannot write cache file ' + cache_path + ': ' + str(e)
+
+    return None
@@ -14,10 +14,11 @@
 # Imports
 # ------------------------------------------------------------------------------
 
-import sys
-import subprocess
+import csv
+import os
 import re
 import ansible_collections.oneidentity.privilege_manager.plugins.module_utils.check_file_exec as cfe
+import ansible_collections.oneidentity.privilege_manager.plugins.module_utils.process as process
 
 
 # ------------------------------------------------------------------------------
@@ -38,104 +39,223 @@ PMJOIN_PLUGIN_PATH = BASE_DIR + '/' + PMJOIN_PLUGIN_FILE
 PMINFO_AGENT_PATH = BASE_DIR + '/' + PMINFO_AGENT_FILE
 PMINFO_PLUGIN_PATH = BASE_DIR + '/' + PMINFO_PLUGIN_FILE
 
+# Seconds pm*info may run to show the join status
+PMINFO_TIMEOUT = 60
+
+# Fields of pm*info -c output that tell if the host is joined, and to which
+# policy server
+PMINFO_JOINED_FIELD = 'Joined to a policy group'
+PMINFO_SERVER_FIELD = 'Hostname of primary policy server'
+
+# Fields of pm*info -c output that may hold the Privilege Manager version
+PMINFO_VERSION_RE = re.compile(r'version', re.IGNORECASE)
+
+# Privilege Manager types
+PM_TYPE_AGENT = 'agent'
+PM_TYPE_PLUGIN = 'plugin'
+
+# Error of pmjoin_find() when neither the agent nor the plugin is installed
+PMJOIN_NOT_FOUND = 'pmjoin not found'
+
 
 # ------------------------------------------------------------------------------
-# Functions
+# Classes
 # ------------------------------------------------------------------------------
 
-# TODO: Make funciton to find which binary is present if any (check_file_exec.py)
+# ------------------------------------------------------------------------------
+class PmjoinStatus(object):
+    """
+    Join status of the host, see pmjoin_status().  pm_type is the
+    Privilege Manager type (agent or plugin), join_path and info_path are the
+    paths of its pmjoin and pm*info binaries.  server is the primary policy
+    server if joined, otherwise None.  info holds every field pm*info -c
+    printed, by name, see pmjoin_info_parse().
+    """
 
-# TODO: Make function below return join status
+    __slots__ = ('pm_type', 'join_path', 'info_path', 'version', 'joined', 'server', 'info')
+
+    def __init__(self, pm_type, join_path, info_path, version):
+        self.pm_type = pm_type
+        self.join_path = join_path
+        self.info_path = info_path
+        self.version = version
+        self.joined = False
+        self.server = None
+        self.info = {}
+
+    def to_dict(self):
+        return {
+            'type': self.pm_type,
+            'join_path': self.join_path,
+            'info_path': self.info_path,
+            'version': self.version,
+            'joined': self.joined,
+            'server': self.server,
+            'info': self.info
+        }
 
 
+# ------------------------------------------------------------------------------
+# Functions
+# ------------------------------------------------------------------------------
+
 # ------------------------------------------------------------------------------
 def pmjoin_find():
     """
-    Find which pmjoin binary is present to determine if this is an agent or plugin environment
+    Find which pmjoin binary is present to determine if this is an agent or plugin environment.
+    The agent is preferred if both can be run.  If pm*info is present but
+    cannot be run, its error is returned together with its paths,
+    PMJOIN_NOT_FOUND is only returned if neither is present.  No binary is
+    run here.
     """
 
-    err = None
+    err = PMJOIN_NOT_FOUND
     join_path = None
     info_path = None
-    join_version = ''
-
-    pmjoin_agent_cfe = cfe.check_file_exec(PMINFO_AGENT_PATH, '-v')
-    pmjoin_plugin_cfe = cfe.check_file_exec(PMINFO_PLUGIN_PATH, '-v')
 
-    if not pmjoin_agent_cfe[0]:
-        join_path = PMJOIN_AGENT_PATH
-        info_path = PMINFO_AGENT_PATH
-        join_version = pmjoin_agent_cfe[1]
+    for pm_join_path, pm_info_path in ((PMJOIN_AGENT_PATH, PMINFO_AGENT_PATH),
+                                       (PMJOIN_PLUGIN_PATH, PMINFO_PLUGIN_PATH)):
+        if not os.path.isfile(pm_info_path):
+            continue
 
-    elif not pmjoin_plugin_cfe[0]:
-        join_path = PMJOIN_PLUGIN_PATH
-        info_path = PMINFO_PLUGIN_PATH
-        join_version = pmjoin_plugin_cfe[1]
+        if os.access(pm_info_path, os.X_OK):
+            return None, pm_join_path, pm_info_path
 
-    else:
-        err = 'pmjoin not found'
+        if join_path is None:
+            err = 'Insufficient permissions to execute ' + pm_info_path
+            join_path = pm_join_path
+            info_path = pm_info_path
 
-    return err, join_path, info_path, join_version
+    return err, join_path, info_path
 
 
 # ------------------------------------------------------------------------------
 def pmjoin_status():
     """
-    Call pm*info to get status
+    Finds the pmjoin binary and calls pm*info -c to get the join status.  The
+    version is taken from the same output, pm*info -v is only run (and its
+    result cached, see check_file_exec) if that shows no version.  Returns err
+    (None, or a string describing why the status is unknown) and a
+    PmjoinStatus, or None if pmjoin was not found.  If pm*info is present but
+    cannot be run, the status only has its type and paths.
     """
 
     # Return values
-    policy_group = None
+    err = None
+    status = None
+
+    err, join_path, info_path = pmjoin_find()
+    if join_path is None:
+        return err, status
 
-    pmpath = pmjoin_find()
-    if pmpath[0]:
-        return policy_group
+    pm_type = PM_TYPE_AGENT if join_path == PMJOIN_AGENT_PATH else PM_TYPE_PLUGIN
+    status = PmjoinStatus(pm_type, join_path, info_path, '')
+    if err is not None:
+        return err, status
 
     # Build pm*info command
     cmd = []
-    cmd += [pmpath[2]]
+    cmd += [info_path]
     cmd += ['-c']
 
-    # Call pm*info
-    try:
-        p = subprocess.Popen(' '.join(cmd), stdin=None, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
-        rval_bytes, rval_err = p.communicate()
-        rval_bytes += rval_err
-    # This exception happens when the process exits with a non-zero return code
-    except subprocess.CalledProcessError as e:
-        # Just grab output bytes likes a normal exit, we'll parse it for errors anyway
-        rval_bytes = e.output
-    # Popen returns list of bytes so we have to decode to get a string
-    rval_str = rval_bytes.decode(sys.stdout.encoding)
-
-    # Parse vastool return
-    policy_group = pmjoin_status_parse(rval_str)
+    # Call pm*info, the output is parsed whatever the return code
+    err, rc, rval_out, rval_err, duration = process.run_process(cmd, timeout=PMINFO_TIMEOUT, max_output=0)
+    if err is not None:
+        return err, status
+
+    # Parse pm*info return
+    status.info = pmjoin_info_parse(rval_out + rval_err)
+    status.joined = status.info.get(PMINFO_JOINED_FIELD) == 'YES'
+    status.server = pmjoin_info_server(status.info)
+    status.version = pmjoin_info_version(status.info)
+
+    # Older pm*info -c output has no version
+    if not status.version:
+        err, status.version = cfe.get_file_version(info_path, '-v', cfe.VERSION_CACHE_PATH_DEFAULT)
 
     # Return
-    return policy_group
+    return err, status
 
 
 # ------------------------------------------------------------------------------
 def pmjoin_status_parse(rval_str):
+    """
+    Returns the policy server of pm*info -c output, or None if not joined
+    """
 
-    # Return values
-    policy_server = None
-
-    # Find if joined
-    joined = False
-    join_re_str = r'Joined to a policy group,(\S+)$'
-    join_re = re.compile(join_re_str, re.MULTILINE)
-    join_re_match = join_re.split(rval_str)
-    if len(join_re_match) > 1 and join_re_match[1] == 'YES':
-        joined = True
-
-    # Find server
-    if joined:
-        group_re_str = r'Hostname of primary policy server,(.+)$'
-        group_re = re.compile(group_re_str, re.MULTILINE)
-        group_re_match = group_re.split(rval_str)
-        if len(group_re_match) > 1:
-            policy_server = group_re_match[1]
+    return pmjoin_info_server(pmjoin_info_parse(rval_str))
 
-    # Return
-    return policy_server
+
+# ------------------------------------------------------------------------------
+def pmjoin_info_parse(rval_str):
+    """
+    Parses pm*info -c output in a single pass and returns its name,value lines
+    as a dict.  Values may be quoted CSV fields.  A name that shows up on more
+    than one line (e.g. secondary policy servers) gets the list of its values.
+    Lines without a name, like headers and blank lines, are skipped.
+
+    Example:
+    Joined to a policy group,YES
+    Hostname of primary policy server,policy1.example.com
+    Hostname of secondary policy server,policy2.example.com
+    Hostname of secondary policy server,policy3.example.com
+    ->
+    {
+        'Joined to a policy group': 'YES',
+        'Hostname of primary policy server': 'policy1.example.com',
+        'Hostname of secondary policy server': ['policy2.example.com', 'policy3.example.com']
+    }
+    """
+
+    info = {}
+    for line in rval_str.splitlines():
+        name, sep, value = line.partition(',')
+        name = name.strip()
+        if not sep or not name:
+            continue
+
+        value = value.strip()
+        if value[:1] == '"':
+            value = ','.join(next(csv.reader((value,)), []))
+
+        if name not in info:
+            info[name] = value
+        elif isinstance(info[name], list):
+            info[name].append(value)
+        else:
+            info[name] = [info[name], value]
+
+    return info
+
+
+# ------------------------------------------------------------------------------
+def pmjoin_info_server(info):
+    """
+    Returns the primary policy server of parsed pm*info -c output, or None if
+    not joined
+    """
+
+    if info.get(PMINFO_JOINED_FIELD) != 'YES':
+        return None
+
+    server = info.get(PMINFO_SERVER_FIELD)
+    if isinstance(server, list):
+        server = server[0]
+    return server if server else None
+
+
+# ------------------------------------------------------------------------------
+def pmjoin_info_version(info):
+    """
+    Returns the Privilege Manager version of parsed pm*info -c output, from
+    the first field with version in its name, or an empty string if there is
+    none
+    """
+
+    for name, value in info.items():
+        if PMINFO_VERSION_RE.search(name):
+            version = cfe.parse_file_version(value if not isinstance(value, list) else value[0])
+            if version:
+                return version
+
+    return ''
@@ -0,0 +1,158 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# Copyright (c) 2022, One Identity LLC
+# File: preflight_steps.py
+# Desc: Ansible utils module that parses the CSV output of pmpreflight into
+#       step records.
+# Auth: Laszlo Nagy
+# Note:
+# ------------------------------------------------------------------------------
+
+
+# ------------------------------------------------------------------------------
+# Imports
+# ------------------------------------------------------------------------------
+
+import csv
+
+
+# ------------------------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------------------------
+
+# Results by result code
+RESULTS = {
+    0: 'Pass',
+    1: 'Warning',
+    2: 'Failure',
+    255: 'Skipped'
+}
+
+# Results that make preflight fail
+ERROR_RESULTS = ('Failure', 'Timeout')
+
+# A step line has at least the result code, check ID, description and message
+MIN_STEP_FIELDS = 4
+
+
+# ------------------------------------------------------------------------------
+# Classes
+# ------------------------------------------------------------------------------
+
+# ------------------------------------------------------------------------------
+class PreflightStep(object):
+    """
+    A preflight check and its result.  code is the numeric result code (None
+    for a check that did not finish), extra holds any non-empty fields after
+    the first message field, which are also part of message.
+    start, end and duration are the time of the check, if known.
+    """
+
+    __slots__ = ('code', 'check_id', 'description', 'message', 'extra', 'result',
+        'start', 'end', 'duration')
+
+    def __init__(self, code, check_id, description, message, extra=None, result=None):
+        self.code = code
+        self.check_id = check_id
+        self.description = description
+        self.message = message
+        self.extra = extra if extra is not None else []
+        self.result = result if result is not None else RESULTS.get(code, code)
+        self.start = None
+        self.end = None
+        self.duration = None
+
+    def set_time(self, start, end):
+        self.start = round(start, 3)
+        self.end = round(end, 3)
+        self.duration = round(end - start, 3)
+
+    def to_dict(self):
+        step = {
+            'code': self.code,
+            'check_id': self.check_id,
+            'description': self.description,
+            'message': self.message,
+            'extra': self.extra,
+            'result': self.result
+        }
+        if self.duration is not None:
+            step['start'] = self.start
+            step['end'] = self.end
+            step['duration'] = self.duration
+        return step
+
+
+# ------------------------------------------------------------------------------
+# Functions
+# ------------------------------------------------------------------------------
+
+# ------------------------------------------------------------------------------
+def parse_preflight_step(step_line):
+    """
+    Returns the step of a preflight CSV output line, or None if the line is not
+    a step.  Quoted fields may contain commas and doubled quotes.
+    """
+
+    # Lines without a digit in front cannot be steps, skip them before parsing
+    if not step_line.lstrip()[:1].isdigit():
+        return None
+
+    if '"' in step_line:
+        fields = next(csv.reader((step_line,)), [])
+    else:
+        fields = step_line.rstrip('\r\n').split(',')
+    return step_from_fields(fields)
+
+
+# ------------------------------------------------------------------------------
+def parse_preflight_steps(step_lines):
+    """
+    Returns the steps of an iterable of preflight CSV output lines, skipping
+    the lines that are not steps
+    """
+
+    steps = []
+    for fields in csv.reader(step_lines):
+        step = step_from_fields(fields)
+        if step is not None:
+            steps.append(step)
+
+    return steps
+
+
+# ------------------------------------------------------------------------------
+def step_from_fields(fields):
+    """
+    Returns the step of the CSV fields of a line, or None if they are not a
+    step
+    """
+
+    if len(fields) < MIN_STEP_FIELDS:
+        return None
+
+    try:
+        code = int(fields[0])
+    except ValueError:
+        return None
+
+    # Step lines end with a comma, so there usually is a single empty extra
+    # field.  pmpreflight does not always quote messages that contain commas,
+    # so any other fields are the rest of the message.
+    message = [field.strip() for field in fields[MIN_STEP_FIELDS - 1 :] if field.strip()]
+
+    return PreflightStep(code, fields[1].strip(), fields[2].strip(), ', '.join(message), message[1:])
+
+
+# ------------------------------------------------------------------------------
+def preflight_steps_error(steps):
+    """
+    Returns the messages of the failed steps, or None if no step failed
+    """
+
+    err_list = [step.result + ': ' + step.message for step in steps
+        if step.result in ERROR_RESULTS and step.message]
+
+    return '\n'.join(err_list) if err_list else None
@@ -0,0 +1,282 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# Copyright (c) 2022, One Identity LLC
+# File: process.py
+# Desc: Ansible utils module that runs a command without a shell, reading its
+#       output as it arrives, and kills it together with its child processes
+#       when it runs too long.
+# Auth: Laszlo Nagy
+# Note:
+# ------------------------------------------------------------------------------
+
+
+# ------------------------------------------------------------------------------
+# Imports
+# ------------------------------------------------------------------------------
+
+from ansible.module_utils.common.text.converters import to_bytes, to_text
+import errno
+import os
+import resource
+import select
+import shlex
+import signal
+import subprocess
+import time
+
+
+# ------------------------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------------------------
+
+# Output is read in chunks of this size
+READ_CHUNK_SIZE = 4096
+
+# At most this many bytes of stdout and of stderr are kept, the rest is read
+# and dropped so that the command does not block.  Commands whose whole output
+# is parsed at once pass 0 (no limit).
+MAX_OUTPUT_DEFAULT = 1024 * 1024
+
+# Seconds between SIGTERM and SIGKILL when a command is killed
+KILL_GRACE_PERIOD = 2
+
+# Seconds between checks whether a command that closed its output has exited
+WAIT_POLL_INTERVAL = 0.05
+
+
+# ------------------------------------------------------------------------------
+# Globals
+# ------------------------------------------------------------------------------
+
+# Commands run during this module run, see runs()
+_runs = []
+
+
+# ------------------------------------------------------------------------------
+# Functions
+# ------------------------------------------------------------------------------
+
+# ------------------------------------------------------------------------------
+def split_args(args):
+    """
+    Splits a string of extra arguments like a shell would, without running
+    one
+    """
+
+    return shlex.split(args) if args else []
+
+
+# ------------------------------------------------------------------------------
+def runs():
+    """
+    Returns the commands run during this module run, each with its name
+    (basename of the command), return code and wall clock, user and system
+    time in seconds
+    """
+
+    return _runs
+
+
+# ------------------------------------------------------------------------------
+def run_process(
+        argv,
+        input_data=None,
+        timeout=0,
+        idle_timeout=0,
+        merge_stderr=False,
+        max_output=MAX_OUTPUT_DEFAULT,
+        line_callback=None):
+    """
+    Runs the command argv (a list, run directly without a shell) in a new
+    session and reads its output as it arrives.
+
+    input_data is written to the stdin of the command, if given.  If the
+    command runs longer than timeout seconds, or has no output for
+    idle_timeout seconds, it is killed together with its child processes (0
+    means no limit).  With merge_stderr, stderr goes to stdout.  At most
+    max_output bytes of each stream are returned (0 means no limit).
+    line_callback, if given, is called with each line of stdout (without the
+    line end) and the time it arrived.
+
+    Returns err (None, or a string describing the timeout or the output that
+    did not fit into max_output), the return code (None after an error),
+    stdout and stderr as text, and the time in seconds the command ran.  Output
+    beyond max_output is only not an error with line_callback, which gets all
+    of stdout.  OSError is raised if the command cannot be run.
+    """
+
+    # Return values
+    err = None
+
+    usage_start = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start_time = time.time()
+    last_time = start_time
+    p = subprocess.Popen([to_bytes(arg, errors='surrogate_or_strict') for arg in argv],
+        stdin=subprocess.PIPE if input_data is not None else None,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT if merge_stderr else subprocess.PIPE,
+        preexec_fn=os.setsid)
+
+    # Input is small (e.g. a password), so it is written before reading
+    if input_data is not None:
+        try:
+            p.stdin.write(to_bytes(input_data, errors='surrogate_or_strict'))
+        except (IOError, OSError) as e:
+            if e.errno != errno.EPIPE:
+                raise
+        finally:
+            try:
+                p.stdin.close()
+            except (IOError, OSError):
+                pass
+
+    out_fd = p.stdout.fileno()
+    err_fd = None if merge_stderr else p.stderr.fileno()
+    streams = {out_fd: []}
+    sizes = {out_fd: 0}
+    if err_fd is not None:
+        streams[err_fd] = []
+        sizes[err_fd] = 0
+    open_fds = list(streams)
+    line_buf = b''
+
+    while open_fds:
+
+        # Wait for output until the next timeout
+        wait = None
+        now = time.time()
+        if timeout:
+            wait = start_time + timeout - now
+        if idle_timeout:
+            idle_wait = last_time + idle_timeout - now
+            wait = idle_wait if wait is None else min(wait, idle_wait)
+        if wait is not None and wait <= 0:
+            err = timeout_error(argv, start_time, timeout, idle_timeout)
+            break
+        try:
+            ready = select.select(open_fds, [], [], wait)[0]
+        except select.error as e:
+            if e.args[0] == errno.EINTR:
+                continue
+            raise
+
+        for fd in ready:
+            chunk = os.read(fd, READ_CHUNK_SIZE)
+            if not chunk:
+                open_fds.remove(fd)
+                if fd == out_fd and line_buf and line_callback is not None:
+                    line_callback(to_text(line_buf, errors='surrogate_or_strict'), time.time())
+                continue
+            last_time = time.time()
+
+            # Keep output up to max_output bytes
+            if not max_output:
+                streams[fd].append(chunk)
+            elif sizes[fd] < max_output:
+                streams[fd].append(chunk[:max_output - sizes[fd]])
+            sizes[fd] += len(chunk)
+
+            # Pass complete lines of stdout on as they arrive
+            if fd == out_fd and line_callback is not None:
+                lines = (line_buf + chunk).split(b'\n')
+                line_buf = lines.pop()
+                for line in lines:
+                    line_callback(to_text(line, errors='surrogate_or_strict'), last_time)
+
+    stdout = to_text(b''.join(streams[out_fd]), errors='surrogate_or_strict')
+    stderr = to_text(b''.join(streams[err_fd]), errors='surrogate_or_strict') if err_fd is not None else ''
+    p.stdout.close()
+    if err_fd is not None:
+        p.stderr.close()
+
+    # A command may close its output and keep running, the timeouts still
+    # apply until it exits
+    if err is None:
+        deadlines = []
+        if timeout:
+            deadlines.append(start_time + timeout)
+        if idle_timeout:
+            deadlines.append(last_time + idle_timeout)
+        if not wait_process(p, min(deadlines) if deadlines else None):
+            err = timeout_error(argv, start_time, timeout, idle_timeout)
+
+    if err is not None:
+        kill_process_group(p)
+    rc = p.wait()
+    duration = round(time.time() - start_time, 3)
+
+    usage_end = resource.getrusage(resource.RUSAGE_CHILDREN)
+    _runs.append({
+        'name': os.path.basename(argv[0]),
+        'rc': rc,
+        'wall': duration,
+        'user': round(usage_end.ru_utime - usage_start.ru_utime, 3),
+        'sys': round(usage_end.ru_stime - usage_start.ru_stime, 3)
+    })
+
+    # Never return cut output as if it was complete
+    if err is None and max_output and line_callback is None and max(sizes.values()) > max_output:
+        err = os.path.basename(argv[0]) + ' output exceeded ' + str(max_output) + ' bytes'
+
+    # Return
+    return err, rc if err is None else None, stdout, stderr, duration
+
+
+# ------------------------------------------------------------------------------
+def timeout_error(argv, start_time, timeout, idle_timeout):
+    """
+    Returns the error message of the command argv started at start_time that
+    ran out of time
+    """
+
+    name = os.path.basename(argv[0])
+    if timeout and time.time() >= start_time + timeout:
+        return name + ' did not finish within ' + str(timeout) + ' seconds'
+
+    return name + ' had no output for ' + str(idle_timeout) + ' seconds'
+
+
+# ------------------------------------------------------------------------------
+def wait_process(p, deadline):
+    """
+    Waits until p has exited or deadline (a time, or None for no limit) has
+    passed and returns whether p has exited.  Popen.wait() has no timeout on
+    Python 2, so p is polled.
+    """
+
+    if deadline is None:
+        p.wait()
+        return True
+
+    while p.poll() is None:
+        now = time.time()
+        if now >= deadline:
+            return False
+        time.sleep(min(WAIT_POLL_INTERVAL, deadline - now))
+
+    return True
+
+
+# ------------------------------------------------------------------------------
+def kill_process_group(p):
+    """
+    Kills the process group of p, first with SIGTERM and then, after
+    KILL_GRACE_PERIOD seconds or as soon as p has exited, with SIGKILL so that
+    no child process is left behind
+    """
+
+    try:
+        os.killpg(p.pid, signal.SIGTERM)
+    except OSError:
+        return
+
+    deadline = time.time() + KILL_GRACE_PERIOD
+    while time.time() < deadline and p.poll() is None:
+        time.sleep(0.1)
+
+    try:
+        os.killpg(p.pid, signal.SIGKILL)
+    except OSError:
+        pass
@@ -0,0 +1,104 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# Copyright (c) 2022, One Identity LLC
+# File: profiling.py
+# Desc: Ansible utils module that times the phases of a module run, so that the
+#       time spent in external tools can be told apart from the time spent in
+#       the module itself.
+# Auth: Laszlo Nagy
+# Note:
+# ------------------------------------------------------------------------------
+
+
+# ------------------------------------------------------------------------------
+# Imports
+# ------------------------------------------------------------------------------
+
+import contextlib
+import resource
+import sys
+import time
+import ansible_collections.oneidentity.privilege_manager.plugins.module_utils.process as process
+
+
+# ------------------------------------------------------------------------------
+# Functions
+# ------------------------------------------------------------------------------
+
+# ------------------------------------------------------------------------------
+def start_profile(enabled):
+    """
+    Returns a new profile if enabled, otherwise None.  All other functions
+    accept None and then do nothing, so that callers need no checks.
+    """
+
+    if not enabled:
+        return None
+
+    return {
+        'start': time.time(),
+        'runs': len(process.runs()),
+        'phases': {}
+    }
+
+
+# ------------------------------------------------------------------------------
+@contextlib.contextmanager
+def profile_phase(profile, name):
+    """
+    Adds the time spent in the with block to the phase name of profile.  A
+    phase may be entered more than once, its times add up.
+    """
+
+    if profile is None:
+        yield
+        return
+
+    start = time.time()
+    try:
+        yield
+    finally:
+        profile['phases'][name] = profile['phases'].get(name, 0.0) + time.time() - start
+
+
+# ------------------------------------------------------------------------------
+def profile_report(profile):
+    """
+    Returns the timings of profile, or None if there is no profile:
+    - total: seconds since the profile started
+    - phases: seconds spent in each phase
+    - subprocess: number of external tools run and their total wall clock,
+      user and system time in seconds, and each run
+    - wrapper: seconds spent outside external tools
+    - max_rss_kb, children_max_rss_kb: peak resident set size of the module
+      and of the largest external tool in KiB
+    """
+
+    if profile is None:
+        return None
+
+    total = time.time() - profile['start']
+    runs = process.runs()[profile['runs']:]
+    wall = sum(run['wall'] for run in runs)
+
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    rss_scale = 1024 if sys.platform == 'darwin' else 1
+    usage_self = resource.getrusage(resource.RUSAGE_SELF)
+    usage_children = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    return {
+        'total': round(total, 3),
+        'phases': dict((name, round(seconds, 3)) for name, seconds in profile['phases'].items()),
+        'subprocess': {
+            'count': len(runs),
+            'wall': round(wall, 3),
+            'user': round(sum(run['user'] for run in runs), 3),
+            'sys': round(sum(run['sys'] for run in runs), 3),
+            'runs': runs
+        },
+        'wrapper': round(max(total - wall, 0.0), 3),
+        'max_rss_kb': usage_self.ru_maxrss // rss_scale,
+        'children_max_rss_kb': usage_children.ru_maxrss // rss_scale
+    }
@@ -0,0 +1,409 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# Copyright (c) 2022, One Identity LLC
+# File: sudoers.py
+# Desc: Ansible utils module that parses sudoers lines into a compact model of
+#       aliases, Defaults entries and user specifications, and lists the users
+#       and groups referenced by such a model.
+# Auth: Laszlo Nagy
+# Note:
+# ------------------------------------------------------------------------------
+
+
+# ------------------------------------------------------------------------------
+# Imports
+# ------------------------------------------------------------------------------
+
+import re
+
+
+# ------------------------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------------------------
+
+# Alias types, Cmd_Alias is a synonym of Cmnd_Alias
+ALIAS_TYPES = {
+    'User_Alias': 'User_Alias',
+    'Runas_Alias': 'Runas_Alias',
+    'Host_Alias': 'Host_Alias',
+    'Cmnd_Alias': 'Cmnd_Alias',
+    'Cmd_Alias': 'Cmnd_Alias'
+}
+
+# Command tags
+TAGS = [
+    'EXEC', 'NOEXEC',
+    'FOLLOW', 'NOFOLLOW',
+    'INTERCEPT', 'NOINTERCEPT',
+    'LOG_INPUT', 'NOLOG_INPUT',
+    'LOG_OUTPUT', 'NOLOG_OUTPUT',
+    'MAIL', 'NOMAIL',
+    'PASSWD', 'NOPASSWD',
+    'SETENV', 'NOSETENV'
+]
+
+# Command options
+OPTIONS = [
+    'APPARMOR_PROFILE', 'CHROOT', 'CWD', 'LIMITPRIVS', 'NOTAFTER', 'NOTBEFORE',
+    'PRIVS', 'ROLE', 'TIMEOUT', 'TYPE'
+]
+
+# Definitions of an alias line are separated by ':' followed by the next name
+ALIAS_SEP_RE = re.compile(r'\s*:\s*(?=[A-Z][A-Z0-9_]*\s*=)')
+
+# Host specs of a user spec are separated by ':' followed by the next host list
+HOST_SPEC_SEP_RE = re.compile(r'\s*:\s*([^\s=:,()]+(?:\s*,\s*[^\s=:,()]+)*)\s*=(?!=)')
+
+# Binding list of a Defaults entry, commas may be followed by white space
+DEFAULTS_BINDING_RE = re.compile(r'([^\s,]+(?:\s*,\s*[^\s,]+)*)\s*')
+
+# Runas spec, tags and options at the start of a command
+RUNAS_RE = re.compile(r'^\(([^)]*)\)\s*')
+TAG_RE = re.compile(r'^(' + '|'.join(TAGS) + r')\s*:\s*')
+OPTION_RE = re.compile(r'^(' + '|'.join(OPTIONS) + r')\s*=\s*("[^"]*"|\S+)\s+')
+
+
+# ------------------------------------------------------------------------------
+# Functions
+# ------------------------------------------------------------------------------
+
+# ------------------------------------------------------------------------------
+def new_sudoers_model():
+    """
+    Returns an empty sudoers model
+    """
+
+    return {
+        'aliases': {
+            'User_Alias': [],
+            'Runas_Alias': [],
+            'Host_Alias': [],
+            'Cmnd_Alias': []
+        },
+        'defaults': [],
+        'user_specs': [],
+        'unparsed': []
+    }
+
+
+# ------------------------------------------------------------------------------
+def parse_sudoers_line(model, pending, line_str, path, lineno):
+    """
+    Adds a physical sudoers line to model.
+
+    A line ending in a backslash is continued on the next line, unless the
+    backslash is part of a comment.  pending holds the beginning of such a
+    logical line (or None), the new value of pending is returned and must be
+    passed in with the next line of the same file.  After the last line of a
+    file, call flush_sudoers_line() with it.
+    """
+
+    line_str = line_str.rstrip('\r\n')
+
+    if pending is None:
+        pending = {'text': '', 'file': path, 'line': lineno}
+
+    code_str = strip_comment(line_str)
+    if code_str == line_str and line_str.endswith('\\') and not line_str.endswith('\\\\'):
+        pending['text'] += line_str[:-1]
+        return pending
+
+    pending['text'] += line_str
+    flush_sudoers_line(model, pending)
+    return None
+
+
+# ------------------------------------------------------------------------------
+def flush_sudoers_line(model, pending):
+    """
+    Adds the logical line in pending (if any) to model
+    """
+
+    if pending is None:
+        return
+
+    text = strip_comment(pending['text']).strip()
+    if text:
+        parse_sudoers_entry(model, text, pending['file'], pending['line'])
+
+
+# ------------------------------------------------------------------------------
+def strip_comment(text):
+    """
+    Removes a comment from a line.  A '#' starts a comment unless it is escaped,
+    quoted or followed by a digit (a numeric user or group ID).
+    """
+
+    quoted = False
+    escaped = False
+    for i, c in enumerate(text):
+        if escaped:
+            escaped = False
+        elif c == '\\':
+            escaped = True
+        elif c == '"':
+            quoted = not quoted
+        elif c == '#' and not quoted and not text[i + 1 : i + 2].isdigit():
+            return text[:i]
+
+    return text
+
+
+# ------------------------------------------------------------------------------
+def split_list(text, sep=','):
+    """
+    Splits text on sep outside of quotes and parentheses, strips the items and
+    drops empty ones.
+    """
+
+    items = []
+    quoted = False
+    escaped = False
+    nesting = 0
+    start = 0
+    for i, c in enumerate(text):
+        if escaped:
+            escaped = False
+        elif c == '\\':
+            escaped = True
+        elif c == '"':
+            quoted = not quoted
+        elif quoted:
+            continue
+        elif c == '(':
+            nesting += 1
+        elif c == ')' and nesting:
+            nesting -= 1
+        elif c == sep and not nesting:
+            items.append(text[start:i])
+            start = i + 1
+    items.append(text[start:])
+
+    return [item.strip() for item in items if item.strip()]
+
+
+# ------------------------------------------------------------------------------
+def parse_sudoers_entry(model, text, path, lineno):
+    """
+    Adds a logical sudoers line without comment to model
+    """
+
+    keyword = text.split(None, 1)[0]
+
+    if keyword.startswith('Defaults'):
+        entry = parse_defaults(text)
+        target = model['defaults']
+
+    elif keyword in ALIAS_TYPES:
+        for entry in parse_aliases(text[len(keyword) :]):
+            entry['file'] = path
+            entry['line'] = lineno
+            model['aliases'][ALIAS_TYPES[keyword]].append(entry)
+        return
+
+    else:
+        entry = parse_user_spec(text)
+        target = model['user_specs']
+
+    if entry is None:
+        entry = {'text': text}
+        target = model['unparsed']
+
+    entry['file'] = path
+    entry['line'] = lineno
+    target.append(entry)
+
+
+# ------------------------------------------------------------------------------
+def parse_defaults(text):
+    """
+    Defaults[:user_list|@host_list|>runas_list|!cmnd_list] parameter_list
+    """
+
+    binding_type = ''
+    binding = []
+
+    rest = text[len('Defaults') :]
+    if rest[:1] in (':', '@', '>', '!'):
+        binding_type = rest[0]
+        binding_match = DEFAULTS_BINDING_RE.match(rest[1:])
+        if not binding_match:
+            return None
+        binding = split_list(binding_match.group(1))
+        rest = rest[1 + binding_match.end() :]
+    elif rest[:1] and not rest[:1].isspace():
+        return None
+
+    return {
+        'binding_type': binding_type,
+        'binding': binding,
+        'parameters': split_list(rest)
+    }
+
+
+# ------------------------------------------------------------------------------
+def parse_aliases(text):
+    """
+    NAME = item, item, ... [: NAME = item, item, ...]
+    """
+
+    aliases = []
+    for definition in ALIAS_SEP_RE.split(text.strip()):
+        name, eq, members = definition.partition('=')
+        if not eq:
+            continue
+        aliases.append({
+            'name': name.strip(),
+            'members': split_list(members)
+        })
+
+    return aliases
+
+
+# ------------------------------------------------------------------------------
+def parse_user_spec(text):
+    """
+    User_List Host_List = Cmnd_Spec_List [: Host_List = Cmnd_Spec_List] ...
+    """
+
+    lhs, eq, rhs = text.partition('=')
+    if not eq:
+        return None
+
+    # Commas may be followed by white space so remove it before splitting the
+    # user list from the host list
+    lhs_items = re.sub(r'\s*,\s*', ',', lhs.strip()).split()
+    if len(lhs_items) != 2:
+        return None
+
+    privileges = []
+    hosts = lhs_items[1]
+    parts = HOST_SPEC_SEP_RE.split(rhs)
+    for i in range(0, len(parts), 2):
+        privileges.append({
+            'hosts': split_list(hosts),
+            'commands': parse_cmnd_spec_list(parts[i])
+        })
+        if i + 1 < len(parts):
+            hosts = parts[i + 1]
+
+    return {
+        'users': split_list(lhs_items[0]),
+        'privileges': privileges
+    }
+
+
+# ------------------------------------------------------------------------------
+def parse_cmnd_spec_list(text):
+    """
+    Parses a list of commands, each optionally preceded by a runas spec, options
+    and tags.  As in sudo, the runas spec and tags of a command also apply to
+    the commands following it in the list.
+    """
+
+    commands = []
+    runas = None
+    tags = []
+    for item in split_list(text):
+        runas_match = RUNAS_RE.match(item)
+        if runas_match:
+            runas = re.sub(r'\s*:\s*', ':', runas_match.group(1).strip())
+            item = item[runas_match.end() :]
+
+        options = {}
+        while True:
+            option_match = OPTION_RE.match(item)
+            if not option_match:
+                break
+            options[option_match.group(1)] = option_match.group(2).strip('"')
+            item = item[option_match.end() :]
+
+        while True:
+            tag_match = TAG_RE.match(item)
+            if not tag_match:
+                break
+            tag = tag_match.group(1)
+            opposite = tag[2:] if tag.startswith('NO') else 'NO' + tag
+            tags = [t for t in tags if t not in (tag, opposite)] + [tag]
+            item = item[tag_match.end() :]
+
+        command = {
+            'command': item.strip(),
+            'runas': runas,
+            'tags': list(tags)
+        }
+        if options:
+            command['options'] = options
+        commands.append(command)
+
+    return commands
+
+
+# ------------------------------------------------------------------------------
+def sudoers_references(model):
+    """
+    Returns the users and groups referenced by the user lists and runas lists
+    of model, that is by user specifications, User_Alias and Runas_Alias
+    definitions and Defaults entries bound to users or runas users.
+
+    Users and groups are returned by name, or by ID as '#uid' and '#gid'.
+    Aliases, ALL, netgroups and non-Unix groups are left out.
+
+    Example of the result:
+    {
+        'users': ['#0', 'alice', 'root'],
+        'groups': ['wheel']
+    }
+    """
+
+    users = set()
+    groups = set()
+    alias_names = set()
+    for aliases in model['aliases'].values():
+        for alias in aliases:
+            alias_names.add(alias['name'])
+
+    def add_user_list(items):
+        for item in items:
+            item = item.lstrip('!').strip().strip('"')
+            if not item or item == 'ALL' or item in alias_names:
+                continue
+            if item.startswith('%:') or item.startswith('+'):
+                continue
+            if item.startswith('%'):
+                groups.add(item[1:])
+            else:
+                users.add(item)
+
+    def add_group_list(items):
+        for item in items:
+            item = item.lstrip('!').strip().strip('"')
+            if not item or item == 'ALL' or item in alias_names:
+                continue
+            if item.startswith('%:') or item.startswith('+'):
+                continue
+            groups.add(item[1:] if item.startswith('%') else item)
+
+    for alias in model['aliases']['User_Alias'] + model['aliases']['Runas_Alias']:
+        add_user_list(alias['members'])
+
+    for defaults in model['defaults']:
+        if defaults['binding_type'] in (':', '>'):
+            add_user_list(defaults['binding'])
+
+    for user_spec in model['user_specs']:
+        add_user_list(user_spec['users'])
+        for privilege in user_spec['privileges']:
+            for command in privilege['commands']:
+                if command['runas'] is None:
+                    continue
+                runas_users, sep, runas_groups = command['runas'].partition(':')
+                add_user_list(split_list(runas_users))
+                add_group_list(split_list(runas_groups))
+
+    return {
+        'users': sorted(users),
+        'groups': sorted(groups)
+    }
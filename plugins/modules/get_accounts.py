@@ -0,0 +1,384 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# Copyright (c) 2021, One Identity LLC
+# File: get_accounts.py
+# Desc: Ansible module for sudoers role that returns the digest, size and number
+#       of entries of the passwd or group file, and optionally the entries of
+#       the given users or groups.
+# Auth: Laszlo Nagy
+# Note:
+# ------------------------------------------------------------------------------
+
+
+# ------------------------------------------------------------------------------
+# Required Ansible documentation
+# ------------------------------------------------------------------------------
+
+ANSIBLE_METADATA = {
+    'metadata_version': '0.2',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = """
+---
+module: get_accounts.py
+
+short_description: Returns information on the passwd or group file.
+
+version_added: '2.9'
+
+description: >
+    Returns the SHA-256 digest, size and number of entries of the passwd or
+    group file, so that it only needs to be copied when it has changed.
+    Optionally returns the entries of the given users or groups.
+
+options:
+    type:
+        description:
+            - Type of the file
+        type: str
+        required: true
+        choices: ['passwd', 'group']
+    path:
+        description:
+            - Path to the file, /etc/passwd or /etc/group by default
+        type: str
+        required: false
+    names:
+        description:
+            - Users (passwd) or groups (group) whose entries are returned, by
+              name or by ID as '#uid' or '#gid'
+        type: list
+        elements: str
+        required: false
+        default: []
+    facts_key:
+        description:
+            - Ansible facts key
+        type: str
+        required: false
+        default: 'get_accounts'
+    profile:
+        description:
+            - Return the time spent in each phase of the module run, in
+              external tools and in the module itself, and the peak memory use
+        type: bool
+        required: false
+        default: false
+
+author:
+    - Laszlo Nagy (laszlo.nagy@oneidentity.com)
+"""
+
+EXAMPLES = """
+- name: Normal usage
+  get_accounts:
+    type: passwd
+    facts_key: get_passwd
+  register: get_passwd_result
+
+- name: Return the groups referenced by sudoers
+  get_accounts:
+    type: group
+    names: "{{ get_sudoers_result.ansible_facts.get_sudoers.sudoers_references.groups }}"
+    facts_key: get_group
+  register: get_group_result
+"""
+
+RETURN = """
+ansible_facts:
+    description: All non-standard return values are placed in Ansible facts
+    type: dict
+    returned: always
+    keys:
+        changed:
+            description: Did the state of the host change?
+            type: bool
+            returned: always
+        failed:
+            description: Did the module fail?
+            type: bool
+            returned: always
+        msg:
+            description: Additional information if failed
+            type: str
+            returned: always
+        params:
+            description: Parameters passed in
+            type: dict
+            returned: always
+        path:
+            description: Path to the file
+            type: str
+            returned: always
+        size:
+            description: Size of the file in bytes
+            type: int
+            returned: always
+        digest:
+            description: SHA-256 digest of the file
+            type: str
+            returned: always
+        count:
+            description: Number of entries in the file
+            type: int
+            returned: always
+        entries:
+            description: >
+                Entries of the users or groups in names.  A passwd entry has
+                the keys name, uid, gid, gecos, home and shell, a group entry
+                has the keys name, gid and members.
+            type: list of dicts
+            returned: always
+        profile:
+            description: >
+                Timings of the module run: total, phases (read and result),
+                subprocess (count, wall, user, sys and runs), wrapper (time
+                outside external tools), max_rss_kb and children_max_rss_kb
+            type: dict
+            returned: when profile is true
+"""
+
+
+# ------------------------------------------------------------------------------
+# Imports
+# ------------------------------------------------------------------------------
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.common.text.converters import to_bytes, to_text
+import hashlib
+import traceback
+import ansible_collections.oneidentity.privilege_manager.plugins.module_utils.profiling as profiling
+
+
+# ------------------------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------------------------
+
+# Arg choices and defaults
+TYPE_CHOICES = ['passwd', 'group']
+FACTS_KEY_DEFAULT = 'get_accounts'
+PROFILE_DEFAULT = False
+
+# Default path of each type
+PATH_DEFAULTS = {
+    'passwd': '/etc/passwd',
+    'group': '/etc/group'
+}
+
+
+# ------------------------------------------------------------------------------
+# Functions
+# ------------------------------------------------------------------------------
+
+# ------------------------------------------------------------------------------
+def run_module():
+    """
+    Main Ansible module function
+    """
+
+    # Module argument info
+    module_args = {
+            'type': {
+                'type': 'str',
+                'required': True,
+                'choices': TYPE_CHOICES
+            },
+            'path': {
+                'type': 'str',
+                'required': False
+            },
+            'names': {
+                'type': 'list',
+                'elements': 'str',
+                'required': False,
+                'default': []
+            },
+            'facts_key': {
+                'type': 'str',
+                'required': False,
+                'default': FACTS_KEY_DEFAULT
+            },
+            'profile': {
+                'type': 'bool',
+                'required': False,
+                'default': PROFILE_DEFAULT
+            }
+        }
+
+    # Seed result value
+    result = {
+            'changed': False,
+            'failed': False,
+            'msg': ''
+        }
+
+    # Lean on boilerplate code in AnsibleModule class
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    # Run logic
+    # NOTE: This module makes no changes so check mode doesn't need to be handled
+    #       specially
+    err, result = run_normal(module.params, result)
+
+    # Exit
+    module.exit_json(**result)
+
+
+# ------------------------------------------------------------------------------
+def run_normal(params, result):
+    """
+    Normal mode logic.
+
+    params contains input parameters.
+
+    result contains run results skeleton, will modify/add to and then return
+    this value along with an err value that contains None if no error or a string
+    describing the error.
+    """
+
+    # Return data
+    err = None
+    size = 0
+    digest = ''
+    count = 0
+    entries = []
+    profile = profiling.start_profile(params['profile'])
+
+    # Parameters
+    accounts_type = params['type']
+    path = params['path'] if params['path'] else PATH_DEFAULTS[accounts_type]
+    names = params['names'] if params['names'] else []
+    facts_key = params['facts_key'] if params['facts_key'] else FACTS_KEY_DEFAULT
+
+    try:
+        with profiling.profile_phase(profile, 'read'):
+            err, size, digest, count, entries = read_accounts(path, accounts_type, names)
+
+    except Exception:
+        tb = traceback.format_exc()
+        err = str(tb)
+
+    # Build result
+    with profiling.profile_phase(profile, 'result'):
+        result['changed'] = False   # this module never makes any changes to the host
+        result['failed'] = err is not None
+        result['msg'] = err if err is not None else ''
+
+        # Create ansible_facts data
+        result_facts = result.copy()
+        result_facts['params'] = params
+        result_facts['path'] = path
+        result_facts['size'] = size
+        result_facts['digest'] = digest
+        result_facts['count'] = count
+        result_facts['entries'] = entries
+        result['ansible_facts'] = {facts_key: result_facts}
+
+    if profile is not None:
+        result_facts['profile'] = profiling.profile_report(profile)
+
+    # Return
+    return err, result
+
+
+# ------------------------------------------------------------------------------
+def read_accounts(path, accounts_type, names):
+    """
+    Reads the passwd or group file at path in a single pass, computing its
+    size and digest, counting its entries and parsing the entries in names.
+    """
+
+    # Return values
+    err = None
+    size = 0
+    digest = hashlib.sha256()
+    count = 0
+    entries = []
+
+    names = set(names)
+    parse_entry = parse_passwd_entry if accounts_type == 'passwd' else parse_group_entry
+
+    try:
+        f = open(to_bytes(path, errors='surrogate_or_strict'), 'rb')
+    except (IOError, OSError) as e:
+        return 'Cannot open ' + path + ': ' + str(e), size, '', count, entries
+
+    try:
+        for line in f:
+            size += len(line)
+            digest.update(line)
+
+            line = line.strip()
+            if not line or line.startswith(b'#'):
+                continue
+            count += 1
+
+            if not names:
+                continue
+            fields = to_text(line, errors='surrogate_or_strict').split(':')
+            if fields[0] in names or (len(fields) > 2 and '#' + fields[2] in names):
+                entry = parse_entry(fields)
+                if entry is not None:
+                    entries.append(entry)
+    finally:
+        f.close()
+
+    # Return
+    return err, size, digest.hexdigest(), count, entries
+
+
+# ------------------------------------------------------------------------------
+def parse_passwd_entry(fields):
+    """
+    name:password:uid:gid:gecos:home:shell
+    """
+
+    if len(fields) < 7:
+        return None
+
+    return {
+        'name': fields[0],
+        'uid': fields[2],
+        'gid': fields[3],
+        'gecos': fields[4],
+        'home': fields[5],
+        'shell': fields[6]
+    }
+
+
+# ------------------------------------------------------------------------------
+def parse_group_entry(fields):
+    """
+    name:password:gid:members
+    """
+
+    if len(fields) < 4:
+        return None
+
+    return {
+        'name': fields[0],
+        'gid': fields[2],
+        'members': [m for m in fields[3].split(',') if m]
+    }
+
+
+# ------------------------------------------------------------------------------
+def main():
+    """
+    Main
+    """
+
+    run_module()
+
+
+# When run from command line
+# ------------------------------------------------------------------------------
+if __name__ == '__main__':
+    main()
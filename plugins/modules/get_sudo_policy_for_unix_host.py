@@ -46,6 +46,13 @@ options:
         type: str
         required: false
         default: 'sudo_policy_for_unix_host'
+    profile:
+        description:
+            - Return the time spent in each phase of the module run, in
+              external tools and in the module itself, and the peak memory use
+        type: bool
+        required: false
+        default: false
 
 author:
     - Laszlo Nagy (laszlo.nagy@oneidentity.com)
@@ -84,6 +91,14 @@ ansible_facts:
             description: hostname, policy plugin, version and timestamp of each host
             type: list of lists
             returned: always
+        profile:
+            description: >
+                Timings of the module run: total, phases (version, run, parse
+                and result), subprocess (count, wall, user, sys and runs),
+                wrapper (time outside external tools), max_rss_kb and
+                children_max_rss_kb
+            type: dict
+            returned: when profile is true
 """
 
 
@@ -96,11 +111,10 @@ from ansible.module_utils.common.text.converters import to_text
 from io import StringIO
 import csv
 import platform
-import subprocess
-import sys
 import traceback
-import ansible_collections.oneidentity.authentication_services.plugins.module_utils.vastool as vt
-import ansible_collections.oneidentity.authentication_services.plugins.module_utils.check_file_exec as cfe
+import ansible_collections.oneidentity.privilege_manager.plugins.module_utils.check_file_exec as cfe
+import ansible_collections.oneidentity.privilege_manager.plugins.module_utils.process as process
+import ansible_collections.oneidentity.privilege_manager.plugins.module_utils.profiling as profiling
 
 
 # ------------------------------------------------------------------------------
@@ -110,9 +124,13 @@ import ansible_collections.oneidentity.authentication_services.plugins.module_ut
 # Arg defaults
 FACTS_DEFAULT = True
 FACTS_KEY_DEFAULT = 'sudo_policy_for_unix_host'
+PROFILE_DEFAULT = False
 
 PMSRVINFO_PATH = '/opt/quest/sbin/pmsrvinfo'
 
+# Seconds pmsrvinfo may run to list the sudo policies
+PMSRVINFO_TIMEOUT = 300
+
 # ------------------------------------------------------------------------------
 # Functions
 # ------------------------------------------------------------------------------
@@ -134,6 +152,11 @@ def run_module():
                 'type': 'str',
                 'required': False,
                 'default': FACTS_KEY_DEFAULT
+            },
+            'profile': {
+                'type': 'bool',
+                'required': False,
+                'default': PROFILE_DEFAULT
             }
         }
 
@@ -175,6 +198,7 @@ def run_normal(params, result):
     err = None
     version = ''
     sudo_policies = []
+    profile = profiling.start_profile(params['profile'])
 
     # Parameters
     facts = params['facts']
@@ -183,11 +207,12 @@ def run_normal(params, result):
     try:
 
         while True:
-            err, version = cfe.check_file_exec(PMSRVINFO_PATH, '')
+            with profiling.profile_phase(profile, 'version'):
+                err, version = cfe.check_file_exec(PMSRVINFO_PATH, '')
             if err is not None:
                 break
 
-            err, sudo_policies = run_pmsrvinfo()
+            err, sudo_policies = run_pmsrvinfo(profile)
             if err is not None:
                 break
 
@@ -198,23 +223,27 @@ def run_normal(params, result):
         err = str(tb)
 
     # Build result
-    result['changed'] = False   # this module never makes any changes to the host
-    result['failed'] = err is not None
-    result['msg'] = err if err is not None else ''
+    with profiling.profile_phase(profile, 'result'):
+        result['changed'] = False   # this module never makes any changes to the host
+        result['failed'] = err is not None
+        result['msg'] = err if err is not None else ''
 
-    # Create ansible_facts data
-    if facts:
-        result_facts = result.copy()
-        result_facts['params'] = params
-        result_facts['sudo_policy_for_unix_host'] = sudo_policies
-        result['ansible_facts'] = {facts_key: result_facts}
+        # Create ansible_facts data
+        if facts:
+            result_facts = result.copy()
+            result_facts['params'] = params
+            result_facts['sudo_policy_for_unix_host'] = sudo_policies
+            result['ansible_facts'] = {facts_key: result_facts}
+
+    if facts and profile is not None:
+        result_facts['profile'] = profiling.profile_report(profile)
 
     # Return
     return err, result
 
 
 # ------------------------------------------------------------------------------
-def run_pmsrvinfo():
+def run_pmsrvinfo(profile=None):
 
     # Return values
     err = None
@@ -226,21 +255,14 @@ def run_pmsrvinfo():
     cmd += ['-l']
     cmd += ['-c']
 
-    # Call asdcom
-    try:
-        p = subprocess.Popen(' '.join(cmd), stdin=None, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
-        rval_bytes, rval_err = p.communicate()
-        rval_bytes += rval_err
-    # This exception happens when the process exits with a non-zero return code
-    except subprocess.CalledProcessError as e:
-        # Just grab output bytes likes a normal exit, we'll parse it for errors anyway
-        rval_bytes = e.output
-    if p.returncode == 0:
-        # Popen returns list of bytes so we have to decode to get a string
-        rval_str = rval_bytes.decode(sys.stdout.encoding)
+    # Call pmsrvinfo
+    with profiling.profile_phase(profile, 'run'):
+        err, rc, rval_out, rval_err, duration = process.run_process(cmd, timeout=PMSRVINFO_TIMEOUT, max_output=0)
+    if err is None and rc == 0:
 
         # Parse pmsrvinfo return
-        err, sudo_policies = parse_pmsrvinfo_stdout(rval_str)
+        with profiling.profile_phase(profile, 'parse'):
+            err, sudo_policies = parse_pmsrvinfo_stdout(rval_out + rval_err)
 
     # Return
     return err, sudo_policies
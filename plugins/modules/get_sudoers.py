@@ -38,12 +38,96 @@ description: >
     included files.
 
 options:
+    output:
+        description:
+            - Where the complete sudoers file is returned.
+            - C(inline) returns its content in the complete_sudoers fact.
+            - C(spool) writes it to I(spool_path) on the host and only returns
+              its path, size and digest.
+            - C(archive) does not return the complete sudoers file.  Instead
+              all sudoers files are packed into a gzip compressed tar archive
+              at I(archive_path) on the host and their checksums are returned.
+        type: str
+        required: false
+        default: 'inline'
+        choices: ['inline', 'spool', 'archive']
+    spool_path:
+        description:
+            - Path on the host to which the complete sudoers file is written
+              when I(output=spool)
+        type: str
+        required: false
+        default: '/tmp/1id/complete_sudoers'
+    spool_max_size:
+        description:
+            - Maximum size in bytes of the complete sudoers file when
+              I(output=spool), 0 means no limit
+        type: int
+        required: false
+        default: 104857600
+    archive_path:
+        description:
+            - Path on the host to which the archive of all sudoers files is
+              written when I(output=archive)
+        type: str
+        required: false
+        default: '/tmp/1id/sudoers.tar.gz'
+    compress:
+        description:
+            - Return the complete sudoers file zlib compressed and base64
+              encoded when I(output=inline).  Its size and digest are those of
+              the uncompressed file.  save_sudoers takes it as is with
+              I(encoding=zlib).
+        type: bool
+        required: false
+        default: false
+    cache_path:
+        description:
+            - Path on the host of a cache file that keeps the main sudoers
+              path and sudo version shown by sudo -V, so that sudo -V only
+              runs again after sudo has been replaced.  The cache is ignored
+              unless the file and its directory are owned by the user the
+              module runs as and writable by no one else.  An empty string
+              disables the cache.
+        type: str
+        required: false
+        default: '/var/cache/1id/get_sudoers_cache.json'
+    parse:
+        description:
+            - Parse the sudoers files while reading them and return a model of
+              their aliases, Defaults entries and user specifications
+        type: bool
+        required: false
+        default: false
+    fingerprint:
+        description:
+            - Fingerprint returned by a previous run.  If the files and
+              directories in I(fingerprint_paths) still have the same
+              fingerprint then no sudoers file is read and unchanged is
+              returned true.
+        type: str
+        required: false
+        default: ''
+    fingerprint_paths:
+        description:
+            - Paths returned together with I(fingerprint) by a previous run
+        type: list
+        elements: str
+        required: false
+        default: []
     facts_key:
         description:
             - Ansible facts key
         type: str
         required: false
         default: 'get_sudoers'
+    profile:
+        description:
+            - Return the time spent in each phase of the module run, in
+              external tools and in the module itself, and the peak memory use
+        type: bool
+        required: false
+        default: false
 
 author:
     - Laszlo Nagy (laszlo.nagy@oneidentity.com)
@@ -54,6 +138,35 @@ EXAMPLES = """
   get_sudoers:
     facts_key: get_sudoers
   register: get_sudoers_result
+
+- name: Spool complete sudoers to a file on the host
+  get_sudoers:
+    output: spool
+    spool_path: /tmp/1id/complete_sudoers
+    spool_max_size: 104857600
+  register: get_sudoers_result
+
+- name: Archive all sudoers files on the host
+  get_sudoers:
+    output: archive
+    archive_path: /tmp/1id/sudoers.tar.gz
+  register: get_sudoers_result
+
+- name: Return compressed complete sudoers
+  get_sudoers:
+    compress: true
+  register: get_sudoers_result
+
+- name: Return parsed sudoers
+  get_sudoers:
+    parse: true
+  register: get_sudoers_result
+
+- name: Skip unchanged sudoers
+  get_sudoers:
+    fingerprint: "{{ previous.fingerprint }}"
+    fingerprint_paths: "{{ previous.fingerprint_paths }}"
+  register: get_sudoers_result
 """
 
 RETURN = """
@@ -82,6 +195,14 @@ ansible_facts:
             description: Path to main sudoers file
             type: str
             returned: always
+        sudo_version:
+            description: Version of sudo
+            type: str
+            returned: always
+        sudo_cached:
+            description: Were the main sudoers path and sudo version taken from the cache file?
+            type: bool
+            returned: always
         sudoers_files:
             description: List of sudoers files
             type: list of str
@@ -89,7 +210,74 @@ ansible_facts:
         complete_sudoers:
             description: A single complete sudoers file in which all include directives have been replaced by the content of the included files.
             type: bytes
+            returned: when output is inline
+        complete_sudoers_encoding:
+            description: Encoding of complete_sudoers, C(zlib) (zlib compressed and base64 encoded) or C(none)
+            type: str
+            returned: when output is inline
+        complete_sudoers_size:
+            description: Size of the complete sudoers file in bytes
+            type: int
+            returned: always
+        complete_sudoers_digest:
+            description: SHA-256 digest of the complete sudoers file
+            type: str
+            returned: always
+        spool_path:
+            description: Path to the complete sudoers file on the host
+            type: str
+            returned: when output is spool
+        archive_path:
+            description: >
+                Path to the archive of all sudoers files on the host.  Archive
+                members are named after the sudoers file paths without the
+                leading '/'.
+            type: str
+            returned: when output is archive
+        archive_checksums:
+            description: SHA-256 digest of each archived sudoers file keyed by its normalized path
+            type: dict
+            returned: when output is archive
+        sudoers_model:
+            description: >
+                Parsed sudoers.  A dict with the lists of alias definitions per
+                alias type (aliases), Defaults entries (defaults), user
+                specifications (user_specs) and lines that could not be parsed
+                (unparsed).  Each entry includes the file and line it was
+                defined on.
+            type: dict
+            returned: when parse is true
+        sudoers_references:
+            description: >
+                Users and groups referenced by the parsed sudoers, by name or
+                by ID as '#uid' and '#gid'.  A dict with the lists users and
+                groups.
+            type: dict
+            returned: when parse is true
+        unchanged:
+            description: >
+                Did the fingerprint parameter match?  If so the sudoers files
+                have not been read and no complete sudoers file is returned.
+            type: bool
             returned: always
+        fingerprint:
+            description: >
+                SHA-256 digest of the path, device, inode, size and
+                modification time of all sudoers files and include directories
+            type: str
+            returned: always
+        fingerprint_paths:
+            description: Sudoers files and include directories the fingerprint was computed from
+            type: list of str
+            returned: always
+        profile:
+            description: >
+                Timings of the module run: total, phases (discovery,
+                fingerprint, read, archive and result), subprocess (count, wall,
+                user, sys and runs), wrapper (time outside external tools),
+                max_rss_kb and children_max_rss_kb
+            type: dict
+            returned: when profile is true
 """
 
 
@@ -98,20 +286,62 @@ ansible_facts:
 # ------------------------------------------------------------------------------
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils.common.text.converters import to_text
+from ansible.module_utils.common.text.converters import to_bytes, to_text
+from multiprocessing.pool import ThreadPool
+import base64
+import hashlib
+import io
 import os
 import platform
-import subprocess
-import sys
+import stat
+import tarfile
+import tempfile
 import traceback
+import zlib
+import ansible_collections.oneidentity.privilege_manager.plugins.module_utils.file_cache as file_cache
+import ansible_collections.oneidentity.privilege_manager.plugins.module_utils.process as process
+import ansible_collections.oneidentity.privilege_manager.plugins.module_utils.profiling as profiling
+import ansible_collections.oneidentity.privilege_manager.plugins.module_utils.sudoers as sudoers
 
 
 # ------------------------------------------------------------------------------
 # Constants
 # ------------------------------------------------------------------------------
 
-# Arg defaults
+# Arg choices and defaults
+OUTPUT_DEFAULT = 'inline'
+OUTPUT_CHOICES = ['inline', 'spool', 'archive']
+SPOOL_PATH_DEFAULT = '/tmp/1id/complete_sudoers'
+SPOOL_MAX_SIZE_DEFAULT = 104857600
+ARCHIVE_PATH_DEFAULT = '/tmp/1id/sudoers.tar.gz'
+COMPRESS_DEFAULT = False
+CACHE_PATH_DEFAULT = file_cache.CACHE_DIR_DEFAULT + '/get_sudoers_cache.json'
+PARSE_DEFAULT = False
 FACTS_KEY_DEFAULT = 'get_sudoers'
+PROFILE_DEFAULT = False
+
+# Main sudoers path unless sudo -V shows another one
+SUDOERS_PATH_DEFAULT = '/etc/sudoers'
+SUDOERS_PATH_LABEL = 'Sudoers path: '
+SUDO_VERSION_LABEL = 'Sudo version '
+
+# Seconds sudo -V may run
+SUDO_TIMEOUT = 30
+
+# Directories searched for sudo after PATH
+SUDO_DIRS = ['/usr/bin', '/usr/local/bin', '/bin', '/usr/sbin', '/usr/local/sbin', '/opt/sudo/bin']
+
+# Spooled complete sudoers is written to disk in chunks of this size
+SPOOL_CHUNK_SIZE = 65536
+
+# zlib compression level of the compressed complete sudoers
+COMPRESS_LEVEL = 6
+
+# Files of an include directory are read this many at a time, in a thread pool
+# of INCLUDEDIR_POOL_SIZE threads if there are at least INCLUDEDIR_POOL_MIN_FILES
+INCLUDEDIR_BATCH_SIZE = 64
+INCLUDEDIR_POOL_SIZE = 4
+INCLUDEDIR_POOL_MIN_FILES = 8
 
 
 # ------------------------------------------------------------------------------
@@ -126,10 +356,62 @@ def run_module():
 
     # Module argument info
     module_args = {
+            'output': {
+                'type': 'str',
+                'required': False,
+                'choices': OUTPUT_CHOICES,
+                'default': OUTPUT_DEFAULT
+            },
+            'spool_path': {
+                'type': 'str',
+                'required': False,
+                'default': SPOOL_PATH_DEFAULT
+            },
+            'spool_max_size': {
+                'type': 'int',
+                'required': False,
+                'default': SPOOL_MAX_SIZE_DEFAULT
+            },
+            'archive_path': {
+                'type': 'str',
+                'required': False,
+                'default': ARCHIVE_PATH_DEFAULT
+            },
+            'compress': {
+                'type': 'bool',
+                'required': False,
+                'default': COMPRESS_DEFAULT
+            },
+            'cache_path': {
+                'type': 'str',
+                'required': False,
+                'default': CACHE_PATH_DEFAULT
+            },
+            'parse': {
+                'type': 'bool',
+                'required': False,
+                'default': PARSE_DEFAULT
+            },
+            'fingerprint': {
+                'type': 'str',
+                'required': False,
+                'default': ''
+            },
+            'fingerprint_paths': {
+                'type': 'list',
+                'elements': 'str',
+                'required': False,
+                'default': []
+            },
             'facts_key': {
                 'type': 'str',
                 'required': False,
                 'default': FACTS_KEY_DEFAULT
+            },
+            'profile': {
+                'type': 'bool',
+                'required': False,
+                'default': PROFILE_DEFAULT
             }
         }
 
@@ -169,145 +451,397 @@ def run_normal(params, result):
 
     # Return data
     err = None
+    main_sudoers_path = ''
+    sudo_version = ''
+    sudo_cached = False
     sudoers_files = []
-    complete_sudoers = b''
+    writer = None
+    unchanged = False
+    fingerprint = ''
+    fingerprint_entries = []
+    model = None
+    archive_checksums = {}
 
     # Parameters
+    output = params['output'] if params['output'] else OUTPUT_DEFAULT
+    spool_path = params['spool_path'] if params['spool_path'] else SPOOL_PATH_DEFAULT
+    spool_max_size = params['spool_max_size'] if params['spool_max_size'] else 0
+    archive_path = params['archive_path'] if params['archive_path'] else ARCHIVE_PATH_DEFAULT
+    compress = params['compress']
+    cache_path = params['cache_path']
+    parse = params['parse']
+    prev_fingerprint = params['fingerprint']
+    prev_fingerprint_paths = params['fingerprint_paths'] if params['fingerprint_paths'] else []
     facts_key = params['facts_key'] if params['facts_key'] else FACTS_KEY_DEFAULT
+    profile = profiling.start_profile(params['profile'])
 
     try:
-        err, main_sudoers_path = get_main_sudoers_path()
-        if not err:
-            lines_of_complete_sudoers = []
-            depth = 1
-            err = process_sudoers(main_sudoers_path, sudoers_files, lines_of_complete_sudoers, depth)
-
-        if not err:
-            complete_sudoers = b''.join(lines_of_complete_sudoers)
+        with profiling.profile_phase(profile, 'discovery'):
+            err, main_sudoers_path, sudo_version, sudo_cached = get_main_sudoers_path(cache_path)
+
+        # Skip reading the sudoers files if none of them has changed
+        if not err and prev_fingerprint and prev_fingerprint_paths and \
+                prev_fingerprint_paths[0] == main_sudoers_path:
+            with profiling.profile_phase(profile, 'fingerprint'):
+                fingerprint_entries = stat_fingerprint_paths(prev_fingerprint_paths)
+                if fingerprint_entries is not None:
+                    fingerprint = compute_fingerprint(fingerprint_entries)
+                    unchanged = fingerprint == prev_fingerprint
+                if unchanged:
+                    sudoers_files = [path for path, st in fingerprint_entries if not stat.S_ISDIR(st.st_mode)]
+                else:
+                    fingerprint_entries = []
+
+        if not err and not unchanged:
+            with profiling.profile_phase(profile, 'read'):
+                if output == 'spool':
+                    writer = SudoersWriter(spool_path, spool_max_size)
+                elif output == 'archive':
+                    writer = SudoersWriter(keep=False)
+                else:
+                    writer = SudoersWriter(compress=compress)
+                model = sudoers.new_sudoers_model() if parse else None
+                err = process_sudoers(main_sudoers_path, sudoers_files, writer,
+                    fingerprint_entries, model)
+                if not err:
+                    err = writer.close()
+                    fingerprint = compute_fingerprint(fingerprint_entries)
+
+        if not err and not unchanged and output == 'archive':
+            with profiling.profile_phase(profile, 'archive'):
+                err, archive_checksums = archive_sudoers(archive_path, sudoers_files)
 
     except Exception:
         tb = traceback.format_exc()
         err = str(tb)
 
+    # Never leave a partial spool file behind
+    if err and writer is not None:
+        writer.abort()
+
     # Build result
-    result['changed'] = False   # this module never makes any changes to the host
-    result['failed'] = err is not None
-    result['msg'] = err if err is not None else ''
-
-    # Create ansible_facts data
-    result_facts = result.copy()
-    result_facts['params'] = params
-    result_facts['main_sudoers_path'] = main_sudoers_path
-    result_facts['sudoers_files'] = sudoers_files
-    result_facts['complete_sudoers'] = complete_sudoers
-    result['ansible_facts'] = {facts_key: result_facts}
+    with profiling.profile_phase(profile, 'result'):
+        result['changed'] = False   # this module never makes any changes to the host
+        result['failed'] = err is not None
+        result['msg'] = err if err is not None else ''
+
+        # Create ansible_facts data
+        result_facts = result.copy()
+        result_facts['params'] = params
+        result_facts['main_sudoers_path'] = main_sudoers_path
+        result_facts['sudo_version'] = sudo_version
+        result_facts['sudo_cached'] = sudo_cached
+        result_facts['sudoers_files'] = sudoers_files
+        result_facts['unchanged'] = unchanged
+        result_facts['fingerprint'] = fingerprint if not err else ''
+        result_facts['fingerprint_paths'] = [path for path, st in fingerprint_entries] if not err else []
+        result_facts['complete_sudoers_size'] = writer.size if writer is not None else 0
+        result_facts['complete_sudoers_digest'] = writer.hexdigest() if writer is not None else ''
+        if output == 'spool':
+            if not unchanged:
+                result_facts['spool_path'] = spool_path
+        elif output == 'archive':
+            if not unchanged:
+                result_facts['archive_path'] = archive_path
+                result_facts['archive_checksums'] = archive_checksums
+        else:
+            complete_sudoers = writer.getvalue() if writer is not None and not err else b''
+            if compress:
+                complete_sudoers = to_text(base64.b64encode(complete_sudoers))
+            result_facts['complete_sudoers'] = complete_sudoers
+            result_facts['complete_sudoers_encoding'] = 'zlib' if compress else 'none'
+        if parse:
+            result_facts['sudoers_model'] = model if model is not None and not err else {}
+            result_facts['sudoers_references'] = sudoers.sudoers_references(model) \
+                if model is not None and not err else {'users': [], 'groups': []}
+        result['ansible_facts'] = {facts_key: result_facts}
+
+    if profile is not None:
+        result_facts['profile'] = profiling.profile_report(profile)
 
     # Return
     return err, result
 
 
 # ------------------------------------------------------------------------------
-def get_main_sudoers_path():
+def get_main_sudoers_path(cache_path):
+    """
+    Returns the path of the main sudoers file and the version of sudo as shown
+    by sudo -V.  They are kept in cache_path together with the stat key of the
+    sudo binary, so sudo -V only runs again after sudo has been replaced.
+    """
 
     # Return values
     err = None
-    main_sudoers_path = '/etc/sudoers'
+    main_sudoers_path = SUDOERS_PATH_DEFAULT
+    sudo_version = ''
+    cached = False
+
+    sudo_path = find_sudo()
+    if sudo_path is None:
+        return 'sudo not found', main_sudoers_path, sudo_version, cached
+    sudo_key = file_cache.stat_key(sudo_path)
+
+    cache = file_cache.load_cache(cache_path)
+    if cache.get('sudo_path') == sudo_path and cache.get('sudo_key') == sudo_key and \
+            cache.get('main_sudoers_path'):
+        return err, cache['main_sudoers_path'], cache.get('sudo_version', ''), True
 
     try:
-        p = subprocess.Popen("sudo -V | grep 'Sudoers path:'",
-            stdin=None, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
-        rval_bytes, rval_err = p.communicate()
-        rval_bytes += rval_err
-    # This exception happens when the process exits with a non-zero return code
-    except subprocess.CalledProcessError as e:
-        # Just grab output bytes likes a normal exit, we'll parse it for errors anyway
-        rval_bytes = e.output
-    # Popen returns list of bytes so we have to decode to get a string
-    rval_str = rval_bytes.decode(sys.stdout.encoding)
-
-    if p.returncode > 0:
-        err = rval_str
-    else:
-        label = 'Sudoers path: '
-        if rval_str.startswith(label):
-            main_sudoers_path = rval_str[len(label) : ].strip()
+        err, rc, rval_str, rval_err, duration = process.run_process([sudo_path, '-V'],
+            timeout=SUDO_TIMEOUT, merge_stderr=True, max_output=0)
+    except OSError as e:
+        return 'Cannot run ' + sudo_path + ': ' + str(e), main_sudoers_path, sudo_version, cached
+
+    if err is not None:
+        return err, main_sudoers_path, sudo_version, cached
+    if rc != 0:
+        return rval_str, main_sudoers_path, sudo_version, cached
+
+    # sudo -V only shows the sudoers path when run as root, otherwise the default
+    # is kept
+    for line in rval_str.splitlines():
+        if line.startswith(SUDO_VERSION_LABEL) and not sudo_version:
+            sudo_version = line[len(SUDO_VERSION_LABEL) : ].strip()
+        elif line.startswith(SUDOERS_PATH_LABEL):
+            main_sudoers_path = line[len(SUDOERS_PATH_LABEL) : ].strip()
+
+    # A cache that cannot be written is not an error, sudo -V just runs again
+    file_cache.save_cache(cache_path, {
+        'sudo_path': sudo_path,
+        'sudo_key': sudo_key,
+        'sudo_version': sudo_version,
+        'main_sudoers_path': main_sudoers_path
+    })
 
     # Return
-    return err, main_sudoers_path
+    return err, main_sudoers_path, sudo_version, cached
 
 
 # ------------------------------------------------------------------------------
-def process_sudoers(sudoers_path, sudoers_files, lines_of_complete_sudoers, depth):
+def find_sudo():
+    """
+    Returns the path of the sudo binary in PATH or in SUDO_DIRS, or None
+    """
 
-    # Files that are included may themselves include other files. A hard limit
-    # of 128 nested include files is enforced to prevent include file loops.
-    if depth > 128:
-        return 'A hard limit of 128 nested include files is reached!'
+    dirs = os.environ.get('PATH', '').split(os.pathsep) + SUDO_DIRS
+    for sudo_dir in dirs:
+        if not sudo_dir:
+            continue
+        sudo_path = os.path.join(sudo_dir, 'sudo')
+        if os.path.isfile(sudo_path) and os.access(sudo_path, os.X_OK):
+            return sudo_path
+
+    return None
+
+
+# ------------------------------------------------------------------------------
+def process_sudoers(main_sudoers_path, sudoers_files, writer, fingerprint_entries, model):
+    """
+    Walks the include tree starting at main_sudoers_path and writes the lines of
+    all sudoers files to writer in the order sudo reads them.
+
+    Instead of recursing, a stack of frames is kept.  A file frame holds the
+    lines of a sudoers file being processed, a directory frame holds the files of
+    an @includedir directive not processed yet.  The (device, inode) keys of the
+    files on the stack form the current include chain, so a file including
+    itself, directly or through other files, is reported as soon as it is
+    included again.
+    """
 
     err = None
+    pool = None
+
+    try:
+        stack = []
+        include_chain = set()
+        frame = read_sudoers_file(main_sudoers_path)
+
+        while err is None:
+
+            # Enter a new file
+            if frame is not None:
+                if frame['key'] in include_chain:
+                    chain = [f['path'] for f in stack if 'key' in f] + [frame['path']]
+                    err = 'Include loop detected: ' + ' -> '.join(chain)
+                    break
+
+                # Files that are included may themselves include other files. A hard
+                # limit of 128 nested include files is enforced.
+                if len(include_chain) >= 128:
+                    err = 'A hard limit of 128 nested include files is reached!'
+                    break
+
+                sudoers_files.append(frame['path'])
+                fingerprint_entries.append((frame['path'], frame['stat']))
+                include_chain.add(frame['key'])
+                stack.append(frame)
+                frame = None
+
+            if not stack:
+                break
+            top = stack[-1]
+
+            # Directory frame: continue with its next file
+            if 'include_files' in top:
+                if not top['frames']:
+                    batch = top['include_files'][:INCLUDEDIR_BATCH_SIZE]
+                    top['include_files'] = top['include_files'][INCLUDEDIR_BATCH_SIZE:]
+                    if len(batch) >= INCLUDEDIR_POOL_MIN_FILES:
+                        if pool is None:
+                            pool = ThreadPool(INCLUDEDIR_POOL_SIZE)
+                        top['frames'] = pool.map(read_sudoers_file, batch)
+                    else:
+                        top['frames'] = [read_sudoers_file(f) for f in batch]
+                    top['frames'].reverse()
+                if top['frames']:
+                    frame = top['frames'].pop()
+                else:
+                    stack.pop()
+                continue
+
+            # File frame: leave the file after its last line
+            if top['index'] >= len(top['lines']):
+                if model is not None:
+                    sudoers.flush_sudoers_line(model, top['pending'])
+                include_chain.discard(top['key'])
+                stack.pop()
+                continue
+
+            line, line_text = top['lines'][top['index']]
+            top['index'] += 1
+            line_str = line_text.strip()
+
+            # Include directives are resolved whatever the parser state, so the
+            # files collected do not depend on the parse option.  A logical line
+            # left open before a directive ends there.
+            if model is not None and top['pending'] is not None and \
+                    (line_str.startswith('#include') or line_str.startswith('@include')):
+                sudoers.flush_sudoers_line(model, top['pending'])
+                top['pending'] = None
+
+            # It is possible to include other sudoers files from within the sudoers
+            # file currently being parsed using the @include and @includedir directives.
+            # For compatibility with sudo versions prior to 1.9.1, #include and
+            # #includedir are also accepted.
+            if line_str.startswith('#includedir') or line_str.startswith('@includedir'):
+                # The @includedir directive can be used to create a sudoers.d directory
+                # that the system package manager can drop sudoers file rules into as
+                # part of package installation. For example, given:
+                # @includedir /etc/sudoers.d
+                # sudo will suspend processing of the current file and read each file
+                # in /etc/sudoers.d, skipping file names that end in ‘~’ or contain a
+                # ‘.’ character to avoid causing problems with package manager or editor
+                # temporary/backup files. Files are parsed in sorted lexical order.
+                # Be aware that because the sorting is lexical, not numeric,
+                # /etc/sudoers.d/1_whoops would be loaded after
+                # /etc/sudoers.d/10_second.
+                include_dir = line_str[len('#includedir') : ].strip()
+                include_dir = process_include_filename(include_dir)
+                fingerprint_entries.append((include_dir, os.stat(include_dir)))
+                include_files = [f for f in os.listdir(include_dir) if os.path.isfile(os.path.join(include_dir, f))]
+                if len(include_files) > 0:
+                    # https://stackoverflow.com/a/7372478
+                    include_files = sorted(sorted(include_files), key=type(include_files[0]).upper)
+                    include_files = [os.path.join(include_dir, f) for f in include_files
+                        if f[-1] != '~' and '.' not in f]
+                    stack.append({'include_files': include_files, 'frames': []})
+
+            elif line_str.startswith('#include') or line_str.startswith('@include'):
+                include_file = line_str[len('#include') : ].strip()
+                include_file = process_include_filename(include_file)
+                if include_file[0] != '/':
+                    # If the path to the include file is not fully-qualified (does not
+                    # begin with a ‘/’), it must be located in the same directory as
+                    # the sudoers file it was included from.
+                    # For example, if /etc/sudoers contains the line:
+                    # @include sudoers.local
+                    # the file that will be included is /etc/sudoers.local.
+                    dirname = os.path.dirname(top['path'])
+                    include_file = os.path.join(dirname, include_file)
+                frame = read_sudoers_file(include_file)
+
+            else:
+                err = writer.write(line)
+                if model is not None:
+                    top['pending'] = sudoers.parse_sudoers_line(model, top['pending'], line_text, top['path'], top['index'])
+
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return err
+
 
-    sudoers_files.append(sudoers_path)
+# ------------------------------------------------------------------------------
+def read_sudoers_file(sudoers_path):
+    """
+    Reads and decodes a sudoers file and returns a file frame for
+    process_sudoers().  Runs in the include directory thread pool.
+    """
 
     sudoers_file = open(sudoers_path, 'rb')
-    for line in sudoers_file:
-        line_str = to_text(line, errors='surrogate_or_strict')
-        line_str = line_str.strip()
-
-        # It is possible to include other sudoers files from within the sudoers
-        # file currently being parsed using the @include and @includedir directives.
-        # For compatibility with sudo versions prior to 1.9.1, #include and
-        # #includedir are also accepted.
-        if line_str.startswith('#includedir') or line_str.startswith('@includedir'):
-            # The @includedir directive can be used to create a sudoers.d directory
-            # that the system package manager can drop sudoers file rules into as
-            # part of package installation. For example, given:
-            # @includedir /etc/sudoers.d
-            # sudo will suspend processing of the current file and read each file
-            # in /etc/sudoers.d, skipping file names that end in ‘~’ or contain a
-            # ‘.’ character to avoid causing problems with package manager or editor
-            # temporary/backup files. Files are parsed in sorted lexical order.
-            # Be aware that because the sorting is lexical, not numeric,
-            # /etc/sudoers.d/1_whoops would be loaded after
-            # /etc/sudoers.d/10_second.
-            include_dir = line_str[len('#includedir') : ].strip()
-            include_dir = process_include_filename(include_dir)
-            include_files = [f for f in os.listdir(include_dir) if os.path.isfile(os.path.join(include_dir, f))]
-            if len(include_files) > 0:
-                # https://stackoverflow.com/a/7372478
-                include_files = sorted(sorted(include_files), key=type(include_files[0]).upper)
-                for include_file in include_files:
-                    if include_file[-1] == '~':
-                        continue
-                    if '.' in include_file:
-                        continue
-                    include_file = os.path.join(include_dir, include_file)
-                    err = process_sudoers(include_file, sudoers_files,
-                        lines_of_complete_sudoers, depth + 1)
-                    if err:
-                        break
-
-        elif line_str.startswith('#include') or line_str.startswith('@include'):
-            include_file = line_str[len('#include') : ].strip()
-            include_file = process_include_filename(include_file)
-            if include_file[0] != '/':
-                # If the path to the include file is not fully-qualified (does not
-                # begin with a ‘/’), it must be located in the same directory as
-                # the sudoers file it was included from.
-                # For example, if /etc/sudoers contains the line:
-                # @include sudoers.local
-                # the file that will be included is /etc/sudoers.local.
-                dirname = os.path.dirname(sudoers_path)
-                include_file = os.path.join(dirname, include_file)
-            err = process_sudoers(include_file, sudoers_files,
-                lines_of_complete_sudoers, depth + 1)
+    try:
+        st = os.fstat(sudoers_file.fileno())
+        lines = [(line, to_text(line, errors='surrogate_or_strict')) for line in sudoers_file]
+    finally:
+        sudoers_file.close()
 
-        else:
-            lines_of_complete_sudoers.append(line)
+    return {
+        'path': sudoers_path,
+        'stat': st,
+        'key': (st.st_dev, st.st_ino),
+        'lines': lines,
+        'index': 0,
+        'pending': None
+    }
 
-        if err:
-            break
 
-    return err
+# ------------------------------------------------------------------------------
+def archive_sudoers(archive_path, sudoers_files):
+    """
+    Packs the sudoers files into a gzip compressed tar archive so that the
+    controller can get all of them with a single transfer.  The checksum of
+    each file is computed from the same bytes that are archived.
+    """
+
+    # Return values
+    err = None
+    checksums = {}
+
+    archive_dir = os.path.dirname(archive_path)
+    if archive_dir and not os.path.isdir(archive_dir):
+        os.makedirs(archive_dir, 0o700)
+    fd, tmp_path = tempfile.mkstemp(dir=archive_dir if archive_dir else None,
+        prefix='.' + os.path.basename(archive_path) + '.')
+
+    try:
+        archive_file = os.fdopen(fd, 'wb')
+        tar = tarfile.open(fileobj=archive_file, mode='w:gz')
+        for sudoers_path in sudoers_files:
+            sudoers_path = os.path.normpath(sudoers_path)
+            if sudoers_path in checksums:
+                continue
+            sudoers_file = open(sudoers_path, 'rb')
+            try:
+                data = sudoers_file.read()
+                tarinfo = tar.gettarinfo(arcname=sudoers_path.lstrip('/'), fileobj=sudoers_file)
+            finally:
+                sudoers_file.close()
+            tarinfo.size = len(data)
+            tar.addfile(tarinfo, io.BytesIO(data))
+            checksums[sudoers_path] = hashlib.sha256(data).hexdigest()
+        tar.close()
+        archive_file.close()
+        os.rename(tmp_path, archive_path)
+
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+    # Return
+    return err, checksums
 
 
 # ------------------------------------------------------------------------------
@@ -342,6 +876,156 @@ def process_include_filename(include_file):
     return include_file
 
 
+# ------------------------------------------------------------------------------
+def stat_fingerprint_paths(paths):
+    """
+    Returns a list of (path, stat) tuples of the fingerprint paths or None if
+    any of them cannot be stat'd anymore.
+    """
+
+    entries = []
+    for path in paths:
+        try:
+            entries.append((path, os.stat(path)))
+        except OSError:
+            return None
+
+    return entries
+
+
+# ------------------------------------------------------------------------------
+def compute_fingerprint(fingerprint_entries):
+    """
+    The fingerprint is the SHA-256 digest of the path, device, inode, size and
+    modification time of each sudoers file and include directory in the order
+    they were visited.  Any edit of a sudoers file changes its size or
+    modification time, and adding or removing a file in an include directory
+    changes the modification time of the directory, so an unchanged
+    fingerprint means an unchanged complete sudoers file.
+    """
+
+    digest = hashlib.sha256()
+    for path, st in fingerprint_entries:
+        mtime = st.st_mtime_ns if hasattr(st, 'st_mtime_ns') else st.st_mtime
+        entry = '%s\0%d\0%d\0%d\0%s\n' % (path, st.st_dev, st.st_ino, st.st_size, mtime)
+        digest.update(to_bytes(entry, errors='surrogate_or_strict'))
+
+    return digest.hexdigest()
+
+
+# ------------------------------------------------------------------------------
+# Classes
+# ------------------------------------------------------------------------------
+
+# ------------------------------------------------------------------------------
+class SudoersWriter(object):
+    """
+    Collects the lines of the complete sudoers file.
+
+    Without a spool_path the lines are kept in memory and returned by
+    getvalue().  With a spool_path they are buffered and written to a temporary
+    file next to spool_path in chunks of SPOOL_CHUNK_SIZE bytes, and the file is
+    renamed to spool_path by close().  A spool_max_size other than 0 limits the
+    size of the spooled file.  With keep set to False the lines are neither kept
+    nor spooled.  With compress set to True the kept lines are zlib compressed
+    as they are written and getvalue() returns the compressed file.
+
+    The size and SHA-256 digest of the complete sudoers file are computed as
+    lines are written.
+    """
+
+    def __init__(self, spool_path=None, spool_max_size=0, keep=True, compress=False):
+        self.spool_path = spool_path
+        self.spool_max_size = spool_max_size
+        self.keep = keep
+        self.size = 0
+        self._compressor = zlib.compressobj(COMPRESS_LEVEL) if compress else None
+        self._digest = hashlib.sha256()
+        self._lines = []
+        self._chunk_size = 0
+        self._tmp_path = None
+        self._tmp_file = None
+
+        if spool_path:
+            spool_dir = os.path.dirname(spool_path)
+            if spool_dir and not os.path.isdir(spool_dir):
+                os.makedirs(spool_dir, 0o700)
+            fd, self._tmp_path = tempfile.mkstemp(
+                dir=spool_dir if spool_dir else None,
+                prefix='.' + os.path.basename(spool_path) + '.')
+            self._tmp_file = os.fdopen(fd, 'wb')
+
+    def write(self, line):
+        """
+        Add a line, returns None or a string describing the error
+        """
+
+        self.size += len(line)
+        self._digest.update(line)
+
+        if self._tmp_file is None:
+            if self._compressor is not None:
+                line = self._compressor.compress(line)
+            if self.keep and line:
+                self._lines.append(line)
+            return None
+
+        if self.spool_max_size and self.size > self.spool_max_size:
+            return 'Complete sudoers exceeds the maximum size of ' + str(self.spool_max_size) + ' bytes'
+
+        self._lines.append(line)
+        self._chunk_size += len(line)
+        if self._chunk_size >= SPOOL_CHUNK_SIZE:
+            self._flush()
+
+        return None
+
+    def close(self):
+        """
+        Finish writing, returns None or a string describing the error
+        """
+
+        if self._compressor is not None:
+            if self.keep:
+                self._lines.append(self._compressor.flush())
+            self._compressor = None
+
+        if self._tmp_file is not None:
+            self._flush()
+            self._tmp_file.close()
+            self._tmp_file = None
+            os.rename(self._tmp_path, self.spool_path)
+            self._tmp_path = None
+
+        return None
+
+    def abort(self):
+        """
+        Discard a partially written spool file
+        """
+
+        if self._tmp_file is not None:
+            self._tmp_file.close()
+            self._tmp_file = None
+        if self._tmp_path is not None:
+            try:
+                os.remove(self._tmp_path)
+            except OSError:
+                pass
+            self._tmp_path = None
+
+    def getvalue(self):
+        return b''.join(self._lines)
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+    def _flush(self):
+        self._tmp_file.write(b''.join(self._lines))
+        self._lines = []
+        self._chunk_size = 0
+
+
 # ------------------------------------------------------------------------------
 def main():
     """
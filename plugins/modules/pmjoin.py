@@ -73,6 +73,78 @@ options:
         type: str
         required: false
         default: 'vastool_join'
+    profile:
+        description:
+            - Return the time spent in each phase of the module run, in
+              external tools and in the module itself, and the peak memory use
+        type: bool
+        required: false
+        default: false
+    timeout:
+        description:
+            - Seconds pmjoin may run before it is stopped and the run fails
+              with category timeout, 0 for no limit.  A join that is stopped
+              part-way may leave the host partly joined, see I(interrupted).
+        type: int
+        required: false
+        default: 0
+    interrupted:
+        description:
+            - Set by the pmjoin action plugin when it retries a join whose
+              pmjoin run was stopped by I(timeout).  A host that then looks
+              joined is unjoined and joined again rather than taken as already
+              joined, as the stopped run may have left the join incomplete.
+        type: bool
+        required: false
+        default: false
+    concurrency:
+        description:
+            - Maximum number of hosts running pmjoin against the same policy
+              server at the same time, 0 for no limit.  Handled on the
+              controller by the pmjoin action plugin, like all options below.
+              With I(concurrency) or I(rate) set, the module is first run in
+              check mode and only hosts where pmjoin has to run wait for the
+              limits.
+        type: int
+        required: false
+        default: 0
+    rate:
+        description:
+            - Maximum number of pmjoin runs per second against the same policy
+              server, 0 for no limit
+        type: float
+        required: false
+        default: 0
+    burst:
+        description:
+            - Number of pmjoin runs that may start at once before rate applies
+        type: int
+        required: false
+        default: 1
+    retries:
+        description:
+            - Number of times a pmjoin run that failed with a retryable
+              category (timeout, network-unreachable or busy) is retried.
+              Failures of category already-joined, license, auth or error are
+              never retried.
+        type: int
+        required: false
+        default: 0
+    retry_delay:
+        description:
+            - Seconds before the first retry, doubled for each further retry
+              (at most 300 seconds) and jittered
+        type: float
+        required: false
+        default: 5
+    lock_dir:
+        description:
+            - Directory on the controller for the lock files of the limits.
+              Playbooks that use the same directory share the limits of each
+              policy server.
+        type: str
+        required: false
+        default: '~/.ansible/tmp/pmjoin_limits'
 
 author:
     - Mark Stillings (mark.stillings@oneidentity.com)
@@ -85,6 +157,16 @@ EXAMPLES = """
     server: policy1
     password: pass
   register: pmjoin_result
+- name: Join at most 20 hosts at a time and 5 per second to policy1
+  pmjoin:
+    state: joined
+    server: policy1
+    password: pass
+    concurrency: 20
+    rate: 5
+    burst: 20
+    retries: 3
+  register: pmjoin_result
 - name: Simple unjoin
   pmjoin:
     state: unjoined
@@ -119,10 +201,61 @@ ansible_facts:
             description: Version of pmjoin
             type: str
             returned: always
+        type:
+            description: Privilege Manager type, agent or plugin
+            type: str
+            returned: always
+        info:
+            description: >
+                Every field of the pmclientinfo or pmplugininfo -c output by
+                name, e.g. the policy servers, versions, license and ports, as
+                found before the join or unjoin.  A field that is printed more
+                than once gets the list of its values.
+            type: dict
+            returned: always
         output:
             description: pmjoin join/unjoin output
             type: str
             returned: when facts_verbose true
+        category:
+            description: >
+                Category of the failure: already-joined, license, auth,
+                timeout, network-unreachable, busy or error.  An empty string
+                if the module did not fail.
+            type: str
+            returned: always
+        retryable:
+            description: Is the failure worth retrying?
+            type: bool
+            returned: always
+        interrupted:
+            description: Was pmjoin stopped by I(timeout) before it finished?
+            type: bool
+            returned: always
+        profile:
+            description: >
+                Timings of the module run: total, phases (status, join or
+                unjoin, and result), subprocess (count, wall, user, sys and
+                runs), wrapper (time outside external tools), max_rss_kb and
+                children_max_rss_kb
+            type: dict
+            returned: when profile is true
+category:
+    description: Category of the failure, see ansible_facts
+    type: str
+    returned: always
+retryable:
+    description: Is the failure worth retrying? Only retryable failures are retried.
+    type: bool
+    returned: always
+join_attempts:
+    description: Number of times pmjoin was run, see retries
+    type: int
+    returned: always
+join_wait:
+    description: Seconds spent waiting for the concurrency and rate limits
+    type: float
+    returned: always
 """
 
 
@@ -131,12 +264,11 @@ ansible_facts:
 # ------------------------------------------------------------------------------
 
 from ansible.module_utils.basic import AnsibleModule
-import sys
-import subprocess
 import traceback
 import re
 import ansible_collections.oneidentity.privilege_manager.plugins.module_utils.pmjoin as pmj
-from ansible_collections.oneidentity.privilege_manager.plugins.module_utils.misc_utils import enclose_shell_arg
+import ansible_collections.oneidentity.privilege_manager.plugins.module_utils.process as process
+import ansible_collections.oneidentity.privilege_manager.plugins.module_utils.profiling as profiling
 
 
 # ------------------------------------------------------------------------------
@@ -150,6 +282,32 @@ EXTRA_ARGS_DEFAULT = ''
 FACTS_DEFAULT = True
 FACTS_VERBOSE_DEFAULT = True
 FACTS_KEY_DEFAULT = 'pmjoin'
+PROFILE_DEFAULT = False
+TIMEOUT_DEFAULT = 0
+INTERRUPTED_DEFAULT = False
+CONCURRENCY_DEFAULT = 0
+RATE_DEFAULT = 0.0
+BURST_DEFAULT = 1
+RETRIES_DEFAULT = 0
+RETRY_DELAY_DEFAULT = 5.0
+LOCK_DIR_DEFAULT = '~/.ansible/tmp/pmjoin_limits'
+
+# Categories of pmjoin failures: name, regex matched against the error lines,
+# and whether the failure is worth retrying.  The first match wins.
+PMJOIN_ERROR_CATEGORIES = [
+    ('already-joined', re.compile(r'already (joined|a member)', re.IGNORECASE), False),
+    ('license', re.compile(r'licen[cs]e', re.IGNORECASE), False),
+    ('auth', re.compile(
+        r'password|authenticat|permission denied|access denied|not authori[sz]ed', re.IGNORECASE), False),
+    ('timeout', re.compile(r'timed? ?out|did not finish within|had no output for', re.IGNORECASE), True),
+    ('network-unreachable', re.compile(
+        r'unreachable|no route to host|connection (refused|reset|closed)|could not (connect|contact|resolve)|'
+        r'name or service not known|host not found|network', re.IGNORECASE), True),
+    ('busy', re.compile(r'busy|too many|try again|temporar|overload', re.IGNORECASE), True)
+]
+
+# Category of failures that match none of the above
+PMJOIN_ERROR_CATEGORY_DEFAULT = 'error'
 
 
 # ------------------------------------------------------------------------------
@@ -198,6 +356,54 @@ def run_module():
                 'type': 'str',
                 'required': False,
                 'default': FACTS_KEY_DEFAULT
+            },
+            'profile': {
+                'type': 'bool',
+                'required': False,
+                'default': PROFILE_DEFAULT
+            },
+            'timeout': {
+                'type': 'int',
+                'required': False,
+                'default': TIMEOUT_DEFAULT
+            },
+            'interrupted': {
+                'type': 'bool',
+                'required': False,
+                'default': INTERRUPTED_DEFAULT
+            },
+
+            # Handled on the controller by the pmjoin action plugin, which
+            # does not pass them on
+            'concurrency': {
+                'type': 'int',
+                'required': False,
+                'default': CONCURRENCY_DEFAULT
+            },
+            'rate': {
+                'type': 'float',
+                'required': False,
+                'default': RATE_DEFAULT
+            },
+            'burst': {
+                'type': 'int',
+                'required': False,
+                'default': BURST_DEFAULT
+            },
+            'retries': {
+                'type': 'int',
+                'required': False,
+                'default': RETRIES_DEFAULT
+            },
+            'retry_delay': {
+                'type': 'float',
+                'required': False,
+                'default': RETRY_DELAY_DEFAULT
+            },
+            'lock_dir': {
+                'type': 'str',
+                'required': False,
+                'default': LOCK_DIR_DEFAULT
             }
         }
 
@@ -211,23 +417,23 @@ def run_module():
     # Lean on boilerplate code in AnsibleModule class
     module = AnsibleModule(
         argument_spec=module_args,
-        supports_check_mode=False
+        supports_check_mode=True
     )
 
     # Run logic
-    # NOTE: This module does not support check mode right now so no special check handling
-    err, result = run_normal(module.params, result)
+    err, result = run_normal(module.params, result, module.check_mode)
 
     # Exit
     module.exit_json(**result)
 
 
 # ------------------------------------------------------------------------------
-def run_normal(params, result):
+def run_normal(params, result, check_mode=False):
     """
     Normal mode logic.
 
-    params contains input parameters.
+    params contains input parameters, check_mode is True if no changes should
+    be made.
 
     result contains run results skeleton, will modify/add to and then return
     this value along with an err value that contains None if no error or a string
@@ -238,6 +444,10 @@ def run_normal(params, result):
     err = None
     changed = False
     output = ''
+    category = ''
+    pmjoin_interrupted = False
+    status = None
+    profile = profiling.start_profile(params['profile'])
 
     # Parameters
     state = params['state']
@@ -247,39 +457,61 @@ def run_normal(params, result):
     facts = params['facts']
     facts_verbose = params['facts_verbose']
     facts_key = params['facts_key'] if params['facts_key'] else FACTS_KEY_DEFAULT
+    timeout = params['timeout'] if params['timeout'] else 0
+    interrupted = params['interrupted']
 
     try:
 
-        # Check pmjoin
-        err, pmjoin_path, pminfo_path, pmjoin_version = pmj.pmjoin_find()
+        # Check pmjoin and its join status, a failed status check is
+        # classified like a failed pmjoin run (e.g. a pm*info timeout)
+        with profiling.profile_phase(profile, 'status'):
+            err, status = pmj.pmjoin_status()
+        if err is not None:
+            category = classify_pmjoin_error(err)
 
         # Run pmjoin
         if err is None:
-            err, changed, output = run_pmjoin(
-                pmjoin_path,
+            err, changed, output, category = run_pmjoin(
+                status,
                 state,
                 server,
                 password,
-                extra_args)
+                extra_args,
+                timeout,
+                interrupted,
+                check_mode,
+                profile)
+
+            # pmjoin was stopped by the timeout
+            pmjoin_interrupted = err is not None and category == 'timeout'
 
     except Exception:
         tb = traceback.format_exc()
         err = str(tb)
 
     # Build result
-    result['changed'] = changed
-    result['failed'] = err is not None
-    result['msg'] = err if err is not None else ''
-
-    # Create ansible_facts data
-    if facts:
-        result_facts = result.copy()
-        result_facts['params'] = params
-        result_facts['path'] = pmjoin_path
-        result_facts['version'] = pmjoin_version
-        if facts_verbose:
-            result_facts['output'] = output
-        result['ansible_facts'] = {facts_key: result_facts}
+    with profiling.profile_phase(profile, 'result'):
+        result['changed'] = changed
+        result['failed'] = err is not None
+        result['msg'] = err if err is not None else ''
+        result['category'] = (category or PMJOIN_ERROR_CATEGORY_DEFAULT) if err is not None else ''
+        result['retryable'] = err is not None and category_retryable(result['category'])
+        result['interrupted'] = pmjoin_interrupted
+
+        # Create ansible_facts data
+        if facts:
+            result_facts = result.copy()
+            result_facts['params'] = params
+            result_facts['path'] = status.join_path if status is not None else None
+            result_facts['version'] = status.version if status is not None else ''
+            result_facts['type'] = status.pm_type if status is not None else ''
+            result_facts['info'] = status.info if status is not None else {}
+            if facts_verbose:
+                result_facts['output'] = output
+            result['ansible_facts'] = {facts_key: result_facts}
+
+    if facts and profile is not None:
+        result_facts['profile'] = profiling.profile_report(profile)
 
     # Return
     return err, result
@@ -287,54 +519,57 @@ def run_normal(params, result):
 
 # ------------------------------------------------------------------------------
 def run_pmjoin(
-        path,
+        status,
         state,
         server,
         password,
-        extra_args):
+        extra_args,
+        timeout=0,
+        interrupted=False,
+        check_mode=False,
+        profile=None):
     """
-    Run pmjoin
+    Run pmjoin if the join status (see pmj.pmjoin_status) differs from state.
+    After an interrupted join, a host that looks joined is joined again.  In
+    check mode pmjoin is not run, changed tells whether it would be.
+    Returns err, changed, output and the category of err (see
+    PMJOIN_ERROR_CATEGORIES).
     """
 
     # Return values
     err = None
     changed = False
     output = ''
+    category = ''
 
     if not server:
-        return 'Error: join_server is empty string!', changed, output
+        return 'Error: join_server is empty string!', changed, output, PMJOIN_ERROR_CATEGORY_DEFAULT
 
     if not password:
-        return 'Error: password is empty string!', changed, output
-
-    # Check status to decide what to do
-    status_server = pmj.pmjoin_status()
+        return 'Error: password is empty string!', changed, output, PMJOIN_ERROR_CATEGORY_DEFAULT
 
-    # Joined
+    # Work out the pmjoin runs that bring the host to state
+    runs = []
     if state == 'joined':
 
         # If not already joined to a domain then join
-        if status_server is None:
-            err, changed, output = run_pmjoin_join(
-                path,
-                server,
-                password,
-                extra_args
-            )
+        if status.server is None:
+            runs = ['join']
+
+        # If the join status may be left by an interrupted join then unjoin
+        # and join again
+        elif interrupted:
+            runs = ['unjoin', 'join']
 
         # If already joined to requested domain then do nothing
         else:
             output = 'Already joined to server'
 
-    # Unjoined
     elif state == 'unjoined':
 
         # If joined to a domain then unjoin
-        if status_server is not None:
-            err, changed, output = run_pmjoin_unjoin(
-                path,
-                extra_args
-            )
+        if status.server is not None:
+            runs = ['unjoin']
 
         # If already unjoined then do nothing
         else:
@@ -342,10 +577,39 @@ def run_pmjoin(
 
     # Unknown state
     else:
-        err = 'Unexpected state requested: ' + state
+        return 'Unexpected state requested: ' + state, changed, output, PMJOIN_ERROR_CATEGORY_DEFAULT
+
+    # In check mode only report whether pmjoin would run
+    if check_mode:
+        if runs:
+            changed = True
+            output = 'Would run pmjoin to ' + ' and '.join(runs)
+        return err, changed, output, category
+
+    # Run pmjoin
+    for run in runs:
+        with profiling.profile_phase(profile, run):
+            if run == 'join':
+                err, run_changed, run_output, category = run_pmjoin_join(
+                    status.join_path,
+                    server,
+                    password,
+                    extra_args,
+                    timeout
+                )
+            else:
+                err, run_changed, run_output, category = run_pmjoin_unjoin(
+                    status.join_path,
+                    extra_args,
+                    timeout
+                )
+        changed = changed or run_changed
+        output += run_output
+        if err is not None:
+            break
 
     # Return
-    return err, changed, output
+    return err, changed, output, category
 
 
 # ------------------------------------------------------------------------------
@@ -353,76 +617,78 @@ def run_pmjoin_join(
         path,
         server,
         password,
-        extra_args):
+        extra_args,
+        timeout=0):
 
     # Return values
     err = None
     changed = False
     output = ''
+    category = ''
 
-    # Build vastool command
+    # Build pmjoin command
     cmd = []
     cmd += [path]
     cmd += ['-b']
     cmd += ['-a']
     cmd += ['-q']
-    cmd += [enclose_shell_arg(server)]
-    cmd += [extra_args] if extra_args else []
+    cmd += [server]
+    cmd += process.split_args(extra_args)
 
-    # Call vastool
-    try:
-        p = subprocess.Popen(' '.join(cmd), stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
-        rval_bytes, rval_err = p.communicate(password.encode(sys.stdout.encoding))
-        rval_bytes += rval_err
-    # This exception happens when the process exits with a non-zero return code
-    except subprocess.CalledProcessError as e:
-        # Just grab output bytes likes a normal exit, we'll parse it for errors anyway
-        rval_bytes = e.output
-    # Popen returns list of bytes so we have to decode to get a string
-    rval_str = rval_bytes.decode(sys.stdout.encoding)
+    # Call pmjoin with the password on stdin, the output is parsed for errors
+    # whatever the return code
+    err, rc, rval_out, rval_err, duration = process.run_process(cmd, input_data=password, timeout=timeout)
+    rval_str = rval_out + rval_err
+    if err is not None:
+        return err, changed, rval_str, classify_pmjoin_error(err)
 
     # Parse pmjoin return
     err, changed, output = parse_pmjoin_output(rval_str)
+    if err is not None:
+        category = classify_pmjoin_error(err)
+
+    # Joined by someone else since the status check, nothing left to do
+    if category == 'already-joined':
+        err = None
+        category = ''
 
     # Return
-    return err, changed, output
+    return err, changed, output, category
 
 
 # ------------------------------------------------------------------------------
 def run_pmjoin_unjoin(
         path,
-        extra_args):
+        extra_args,
+        timeout=0):
 
     # Return values
     err = None
     changed = False
     output = ''
+    category = ''
 
-    # Build vastool command
+    # Build pmjoin command
     cmd = []
     cmd += [path]
     cmd += ['-b']
     cmd += ['-a']
     cmd += ['-u']
-    cmd += [extra_args] if extra_args else []
+    cmd += process.split_args(extra_args)
 
-    # Call vastool
-    try:
-        p = subprocess.Popen(' '.join(cmd), stdin=None, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
-        rval_bytes, rval_err = p.communicate()
-        rval_bytes += rval_err
-    # This exception happens when the process exits with a non-zero return code
-    except subprocess.CalledProcessError as e:
-        # Just grab output bytes likes a normal exit, we'll parse it for errors anyway
-        rval_bytes = e.output
-    # Popen returns list of bytes so we have to decode to get a string
-    rval_str = rval_bytes.decode(sys.stdout.encoding)
+    # Call pmjoin, the output is parsed for errors whatever the return code
+    err, rc, rval_out, rval_err, duration = process.run_process(cmd, timeout=timeout)
+    rval_str = rval_out + rval_err
+    if err is not None:
+        return err, changed, rval_str, classify_pmjoin_error(err)
 
     # Parse pmjoin return
     err, changed, output = parse_pmjoin_output(rval_str)
+    if err is not None:
+        category = classify_pmjoin_error(err)
 
     # Return
-    return err, changed, output
+    return err, changed, output, category
 
 
 # ------------------------------------------------------------------------------
@@ -455,6 +721,32 @@ def parse_pmjoin_output(output_str):
     return err, changed, output
 
 
+# ------------------------------------------------------------------------------
+def classify_pmjoin_error(err):
+    """
+    Returns the category of a pmjoin error, see PMJOIN_ERROR_CATEGORIES
+    """
+
+    for category, category_re, retryable in PMJOIN_ERROR_CATEGORIES:
+        if category_re.search(err):
+            return category
+
+    return PMJOIN_ERROR_CATEGORY_DEFAULT
+
+
+# ------------------------------------------------------------------------------
+def category_retryable(category):
+    """
+    Returns True if pmjoin failures of category are worth retrying
+    """
+
+    for name, category_re, retryable in PMJOIN_ERROR_CATEGORIES:
+        if name == category:
+            return retryable
+
+    return False
+
+
 # ------------------------------------------------------------------------------
 def main():
     """
@@ -0,0 +1,285 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# Copyright (c) 2022, One Identity LLC
+# File: pmjoin_info.py
+# Desc: Ansible module that returns the Privilege Manager join status of a
+#       host without changing it.
+# Auth: Laszlo Nagy
+# Note:
+# ------------------------------------------------------------------------------
+
+
+# ------------------------------------------------------------------------------
+# Required Ansible documentation
+# ------------------------------------------------------------------------------
+
+ANSIBLE_METADATA = {
+    'metadata_version': '0.2',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = """
+---
+module: pmjoin_info.py
+
+short_description: Returns the Privilege Manager join status of a host.
+
+version_added: '2.9'
+
+description: >
+    Returns whether the host is joined to a policy group, the primary policy
+    server and every other field pmclientinfo (agent) or pmplugininfo (plugin)
+    reports, with a single pm*info -c call (pm*info -v is only run if that
+    does not show the version).  The module never changes the host,
+    needs no credentials and no gathered facts, so it is suited to frequent
+    status sweeps of large fleets.  A host without Privilege Manager is
+    reported as not installed rather than failed.  A host on which pm*info is
+    present but cannot be run or show its version or status fails, with
+    installed true, type and path set.
+
+options:
+    facts:
+        description:
+            - Generate Ansible facts?
+        type: bool
+        required: false
+        default: true
+    facts_key:
+        description:
+            - Ansible facts key
+        type: str
+        required: false
+        default: 'pmjoin_info'
+    profile:
+        description:
+            - Return the time spent in each phase of the module run, in
+              external tools and in the module itself, and the peak memory use
+        type: bool
+        required: false
+        default: false
+
+author:
+    - Laszlo Nagy (laszlo.nagy@oneidentity.com)
+"""
+
+EXAMPLES = """
+- name: Join status
+  pmjoin_info:
+  register: pmjoin_info_result
+
+- name: Hosts not joined
+  debug:
+    msg: Not joined
+  when: not ansible_facts.pmjoin_info.joined
+"""
+
+RETURN = """
+ansible_facts:
+    description: All non-standard return values are placed in Ansible facts
+    type: dict
+    returned: when facts parameter is true
+    keys:
+        changed:
+            description: Did the state of the host change?
+            type: bool
+            returned: always
+        failed:
+            description: Did the module fail?
+            type: bool
+            returned: always
+        msg:
+            description: Additional information if failed
+            type: str
+            returned: always
+        params:
+            description: Parameters passed in
+            type: dict
+            returned: always
+        installed:
+            description: Is Privilege Manager installed?
+            type: bool
+            returned: always
+        type:
+            description: Privilege Manager type, agent or plugin
+            type: str
+            returned: always
+        path:
+            description: Path to pmjoin
+            type: str
+            returned: always
+        version:
+            description: Version of pmjoin
+            type: str
+            returned: always
+        joined:
+            description: Is the host joined to a policy group?
+            type: bool
+            returned: always
+        server:
+            description: Primary policy server, or an empty string if not joined
+            type: str
+            returned: always
+        info:
+            description: >
+                Every field of the pmclientinfo or pmplugininfo -c output by
+                name, e.g. the policy servers, versions, license and ports.  A
+                field that is printed more than once gets the list of its
+                values.
+            type: dict
+            returned: always
+        profile:
+            description: >
+                Timings of the module run: total, phases (status and result),
+                subprocess (count, wall, user, sys and runs), wrapper (time
+                outside external tools), max_rss_kb and children_max_rss_kb
+            type: dict
+            returned: when profile is true
+"""
+
+
+# ------------------------------------------------------------------------------
+# Imports
+# ------------------------------------------------------------------------------
+
+from ansible.module_utils.basic import AnsibleModule
+import traceback
+import ansible_collections.oneidentity.privilege_manager.plugins.module_utils.pmjoin as pmj
+import ansible_collections.oneidentity.privilege_manager.plugins.module_utils.profiling as profiling
+
+
+# ------------------------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------------------------
+
+FACTS_DEFAULT = True
+FACTS_KEY_DEFAULT = 'pmjoin_info'
+PROFILE_DEFAULT = False
+
+
+# ------------------------------------------------------------------------------
+# Functions
+# ------------------------------------------------------------------------------
+
+# ------------------------------------------------------------------------------
+def run_module():
+    """
+    Main Ansible module function
+    """
+
+    # Module argument info
+    module_args = {
+            'facts': {
+                'type': 'bool',
+                'required': False,
+                'default': FACTS_DEFAULT
+            },
+            'facts_key': {
+                'type': 'str',
+                'required': False,
+                'default': FACTS_KEY_DEFAULT
+            },
+            'profile': {
+                'type': 'bool',
+                'required': False,
+                'default': PROFILE_DEFAULT
+            }
+        }
+
+    # Seed result value
+    result = {
+            'changed': False,
+            'failed': False,
+            'msg': ''
+        }
+
+    # Lean on boilerplate code in AnsibleModule class
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    # Run logic
+    # NOTE: This module makes no changes so check mode doesn't need to be handled
+    #       specially
+    err, result = run_normal(module.params, result)
+
+    # Exit
+    module.exit_json(**result)
+
+
+# ------------------------------------------------------------------------------
+def run_normal(params, result):
+    """
+    Normal mode logic.
+
+    params contains input parameters.
+
+    result contains run results skeleton, will modify/add to and then return
+    this value along with an err value that contains None if no error or a string
+    describing the error.
+    """
+
+    # Return data
+    err = None
+    status = None
+    profile = profiling.start_profile(params['profile'])
+
+    # Parameters
+    facts = params['facts']
+    facts_key = params['facts_key'] if params['facts_key'] else FACTS_KEY_DEFAULT
+
+    try:
+
+        # Check pmjoin and its join status, a host without pmjoin is not an
+        # error for a status check but a broken install is
+        with profiling.profile_phase(profile, 'status'):
+            err, status = pmj.pmjoin_status()
+        if err == pmj.PMJOIN_NOT_FOUND:
+            err = None
+
+    except Exception:
+        tb = traceback.format_exc()
+        err = str(tb)
+
+    # Build result
+    with profiling.profile_phase(profile, 'result'):
+        result['changed'] = False   # this module never makes any changes to the host
+        result['failed'] = err is not None
+        result['msg'] = err if err is not None else ''
+
+        # Create ansible_facts data
+        if facts:
+            result_facts = result.copy()
+            result_facts['params'] = params
+            result_facts['installed'] = status is not None
+            result_facts['type'] = status.pm_type if status is not None else ''
+            result_facts['path'] = status.join_path if status is not None else ''
+            result_facts['version'] = status.version if status is not None else ''
+            result_facts['joined'] = status.joined if status is not None else False
+            result_facts['server'] = status.server if status is not None and status.server else ''
+            result_facts['info'] = status.info if status is not None else {}
+            result['ansible_facts'] = {facts_key: result_facts}
+
+    if facts and profile is not None:
+        result_facts['profile'] = profiling.profile_report(profile)
+
+    # Return
+    return err, result
+
+
+# ------------------------------------------------------------------------------
+def main():
+    """
+    Main
+    """
+
+    run_module()
+
+
+# When run from command line
+# ------------------------------------------------------------------------------
+if __name__ == '__main__':
+    main()
@@ -59,6 +59,47 @@ options:
         type: str
         required: false
         default: ''
+    timeout:
+        description:
+            - Maximum time in seconds preflight may run, 0 means no limit.
+              When it is exceeded, preflight and all of its child processes
+              are killed and the checks finished so far are returned together
+              with a check with the result Timeout.
+        type: int
+        required: false
+        default: 0
+    step_timeout:
+        description:
+            - Maximum time in seconds preflight may run without any output
+              (such as the result of a check), 0 means no limit.  Handled
+              like I(timeout).
+        type: int
+        required: false
+        default: 0
+    cache_ttl:
+        description:
+            - Time in seconds for which the checks of a successful run are
+              cached on the host in I(cache_path).  A run with the same
+              preflight version, mode, server, verbose and extra_args within
+              this time returns the cached checks without running preflight.
+              0 disables the cache.
+        type: int
+        required: false
+        default: 0
+    cache_path:
+        description:
+            - Path to the cache file on the host.  The cache is ignored unless
+              the file and its directory are owned by the user the module runs
+              as and writable by no one else.
+        type: str
+        required: false
+        default: '/var/cache/1id/preflight_cache.json'
+    force:
+        description:
+            - Run preflight even if there are cached checks
+        type: bool
+        required: false
+        default: false
     facts:
         description:
             - Generate Ansible facts?
@@ -83,6 +124,13 @@ options:
         type: str
         required: false
         default: /opt/quest/bin/preflight
+    profile:
+        description:
+            - Return the time spent in each phase of the module run, in
+              external tools and in the module itself, and the peak memory use
+        type: bool
+        required: false
+        default: false
 
 author:
     - Mark Stillings (mark.stillings@oneidentity.com)
@@ -123,8 +171,31 @@ ansible_facts:
             description: Version of preflight
             type: str
             returned: always
+        duration:
+            description: Time in seconds preflight took to run
+            type: float
+            returned: always
+        cached:
+            description: Were the checks taken from the cache?
+            type: bool
+            returned: always
+        profile:
+            description: >
+                Timings of the module run: total, phases (version, cache, run,
+                parse and result), subprocess (count, wall, user, sys and
+                runs), wrapper (time outside external tools), max_rss_kb and
+                children_max_rss_kb
+            type: dict
+            returned: when profile is true
         steps:
-            description: The preflight checks and results of those checks
+            description: >
+                The preflight checks and results of those checks.  Each step
+                has the numeric result code, check_id, description, message,
+                result and any extra fields of the check, and also has the time (start and end, in seconds since the epoch)
+                and duration (in seconds) of the check.  Checks are timed by
+                the arrival of their output lines, so a check starts when the
+                output of the previous one arrives.  After a timeout the last
+                step is the unfinished check with the result Timeout.
             type: list of dicts
             returned: when facts_verbose true
 """
@@ -135,11 +206,14 @@ ansible_facts:
 # ------------------------------------------------------------------------------
 
 from ansible.module_utils.basic import AnsibleModule
-import sys
+import time
 import traceback
-import subprocess
 import ansible_collections.oneidentity.privilege_manager.plugins.module_utils.check_file_exec as cfe
-from ansible_collections.oneidentity.authentication_services.plugins.module_utils.misc_utils import enclose_shell_arg
+import ansible_collections.oneidentity.privilege_manager.plugins.module_utils.file_cache as file_cache
+import ansible_collections.oneidentity.privilege_manager.plugins.module_utils.process as process
+import ansible_collections.oneidentity.privilege_manager.plugins.module_utils.profiling as profiling
+from ansible_collections.oneidentity.privilege_manager.plugins.module_utils.preflight_steps import (
+    PreflightStep, parse_preflight_step, preflight_steps_error)
 
 
 # ------------------------------------------------------------------------------
@@ -150,10 +224,16 @@ from ansible_collections.oneidentity.authentication_services.plugins.module_util
 SERVER_DEFAULT = ''
 VERBOSE_DEFAULT = False
 EXTRA_ARGS_DEFAULT = ''
+TIMEOUT_DEFAULT = 0
+STEP_TIMEOUT_DEFAULT = 0
+CACHE_TTL_DEFAULT = 0
+CACHE_PATH_DEFAULT = file_cache.CACHE_DIR_DEFAULT + '/preflight_cache.json'
+FORCE_DEFAULT = False
 PATH_DEFAULT = '/tmp/1id/pmpreflight'
 FACTS_DEFAULT = True
 FACTS_VERBOSE_DEFAULT = True
 FACTS_KEY_DEFAULT = 'preflight'
+PROFILE_DEFAULT = False
 MODE_CHOICES = ['server', 'pmpolicy', 'sudo']
 
 
@@ -189,6 +269,31 @@ def run_module():
                 'required': False,
                 'default': EXTRA_ARGS_DEFAULT
             },
+            'timeout': {
+                'type': 'int',
+                'required': False,
+                'default': TIMEOUT_DEFAULT
+            },
+            'step_timeout': {
+                'type': 'int',
+                'required': False,
+                'default': STEP_TIMEOUT_DEFAULT
+            },
+            'cache_ttl': {
+                'type': 'int',
+                'required': False,
+                'default': CACHE_TTL_DEFAULT
+            },
+            'cache_path': {
+                'type': 'str',
+                'required': False,
+                'default': CACHE_PATH_DEFAULT
+            },
+            'force': {
+                'type': 'bool',
+                'required': False,
+                'default': FORCE_DEFAULT
+            },
             'facts': {
                 'type': 'bool',
                 'required': False,
@@ -204,6 +309,11 @@ def run_module():
                 'required': False,
                 'default': FACTS_KEY_DEFAULT
             },
+            'profile': {
+                'type': 'bool',
+                'required': False,
+                'default': PROFILE_DEFAULT
+            },
             'path': {
                 'type': 'str',
                 'required': False,
@@ -249,12 +359,20 @@ def run_normal(params, result):
     err = None
     version = ''
     steps = []
+    duration = 0.0
+    cached = False
+    profile = profiling.start_profile(params['profile'])
 
     # Parameters
     mode = params['mode']
     server = params['server']
     verbose = params['verbose']
     extra_args = params['extra_args']
+    timeout = params['timeout'] if params['timeout'] else 0
+    step_timeout = params['step_timeout'] if params['step_timeout'] else 0
+    cache_ttl = params['cache_ttl'] if params['cache_ttl'] else 0
+    cache_path = params['cache_path'] if params['cache_path'] else CACHE_PATH_DEFAULT
+    force = params['force']
     facts = params['facts']
     facts_verbose = params['facts_verbose']
     facts_key = params['facts_key'] if params['facts_key'] else FACTS_KEY_DEFAULT
@@ -263,34 +381,64 @@ def run_normal(params, result):
     try:
 
         # Check preflight
-        err, version = cfe.check_file_exec(path, '-v')
+        with profiling.profile_phase(profile, 'version'):
+            err, version = cfe.check_file_exec(path, '-v', cfe.VERSION_CACHE_PATH_DEFAULT)
+
+        # Key of the cached checks
+        cache_key = {
+            'version': version,
+            'mode': mode,
+            'server': server,
+            'verbose': verbose,
+            'extra_args': extra_args
+        }
+
+        # Use cached checks
+        if err is None and cache_ttl and not force:
+            with profiling.profile_phase(profile, 'cache'):
+                cached, steps, duration = load_preflight_cache(cache_path, cache_key, cache_ttl)
 
         # Run preflight
-        if err is None:
-            err, steps = run_preflight(
-                mode,
-                server,
-                verbose,
-                extra_args,
-                path)
+        if err is None and not cached:
+            with profiling.profile_phase(profile, 'run'):
+                err, steps, duration = run_preflight(
+                    mode,
+                    server,
+                    verbose,
+                    extra_args,
+                    path,
+                    timeout,
+                    step_timeout,
+                    profile)
+
+            # Only successful runs are cached, failed checks are run again
+            if err is None and cache_ttl:
+                with profiling.profile_phase(profile, 'cache'):
+                    save_preflight_cache(cache_path, cache_key, steps, duration)
 
     except Exception:
         tb = traceback.format_exc()
         err = str(tb)
 
     # Build result
-    result['changed'] = False   # preflight never makes any changes to the host
-    result['failed'] = err is not None
-    result['msg'] = err if err is not None else ''
-
-    # Create ansible_facts data
-    if facts:
-        result_facts = result.copy()
-        result_facts['params'] = params
-        result_facts['version'] = version
-        if facts_verbose:
-            result_facts['steps'] = steps
-        result['ansible_facts'] = {facts_key: result_facts}
+    with profiling.profile_phase(profile, 'result'):
+        result['changed'] = False   # preflight never makes any changes to the host
+        result['failed'] = err is not None
+        result['msg'] = err if err is not None else ''
+
+        # Create ansible_facts data
+        if facts:
+            result_facts = result.copy()
+            result_facts['params'] = params
+            result_facts['version'] = version
+            result_facts['duration'] = duration
+            result_facts['cached'] = cached
+            if facts_verbose:
+                result_facts['steps'] = steps
+            result['ansible_facts'] = {facts_key: result_facts}
+
+    if facts and profile is not None:
+        result_facts['profile'] = profiling.profile_report(profile)
 
     # Return
     return err, result
@@ -302,7 +450,10 @@ def run_preflight(
         server,
         verbose,
         extra_args,
-        path):
+        path,
+        timeout=0,
+        step_timeout=0,
+        profile=None):
     """
     Run preflight
     """
@@ -315,66 +466,77 @@ def run_preflight(
     cmd = []
     cmd += [path]
     cmd += ['--' + mode]
-    cmd += ['--policyserver ' + enclose_shell_arg(server)] if server and mode in MODE_CHOICES[1:] else []
+    cmd += ['--policyserver', server] if server and mode in MODE_CHOICES[1:] else []
     cmd += ['--verbose'] if verbose else []
     cmd += ['--csv']
-    cmd += [extra_args] if extra_args else []
+    cmd += process.split_args(extra_args)
+
+    # Parse each line of the output as soon as it arrives, a check starts when
+    # the output of the previous one arrives
+    state = {'last_time': time.time(), 'last_line': ''}
+
+    def parse_line(line, line_time):
+        with profiling.profile_phase(profile, 'parse'):
+            step = parse_preflight_step(line)
+            if step is not None:
+                step.set_time(state['last_time'], line_time)
+                steps.append(step)
+                state['last_line'] = ''
+            elif line.strip():
+                state['last_line'] = line.strip()
+            state['last_time'] = line_time
 
     # Call preflight
-    try:
-        p = subprocess.Popen(' '.join(cmd), stdin=None, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
-        rval_bytes, rval_err = p.communicate()
-        rval_bytes += rval_err
-    # This exception happens when the process exits with a non-zero return code
-    except subprocess.CalledProcessError as e:
-        # Just grab output bytes likes a normal exit, we'll parse it for errors anyway
-        rval_bytes = e.output
-    # Popen returns list of bytes so we have to decode to get a string
-    rval_str = rval_bytes.decode(sys.stdout.encoding)
-
-    # Parse preflight return
-    err, steps = parse_preflight_steps(rval_str)
+    timeout_msg, rc, output, output_err, duration = process.run_process(
+        cmd,
+        timeout=timeout,
+        idle_timeout=step_timeout,
+        merge_stderr=True,
+        line_callback=parse_line)
+
+    # After a timeout the unfinished check is the last step
+    if timeout_msg is not None:
+        step = PreflightStep(None, '', state['last_line'] if state['last_line'] else 'Unfinished check',
+            timeout_msg, result='Timeout')
+        step.set_time(state['last_time'], time.time())
+        steps.append(step)
+
+    # Check preflight steps
+    err = preflight_steps_error(steps)
 
     # Return
-    return err, steps
+    return err, [step.to_dict() for step in steps], duration
 
 
 # ------------------------------------------------------------------------------
-def parse_preflight_steps(steps_str):
+def load_preflight_cache(cache_path, cache_key, cache_ttl):
+    """
+    Returns whether there are cached checks for cache_key that are not older
+    than cache_ttl seconds, and those checks and their duration.  A cache file
+    that other users could have written is ignored, see file_cache.load_cache().
+    """
 
-    # Return values
-    err = None
-    steps = []
+    cache = file_cache.load_cache(cache_path)
+    age = time.time() - cache.get('time', 0)
+    if cache.get('key') != cache_key or age < 0 or age > cache_ttl or 'steps' not in cache:
+        return False, [], 0.0
 
-    results = {
-            0: 'Pass',
-            1: 'Warning',
-            2: 'Failure',
-            255: 'Skipped'
-        }
-    for step_line in steps_str.splitlines():
-        step_items = step_line.split(',')
-        if len(step_items) > 4:
-            steps += [
-                {
-                    'description': step_items[2].strip().replace("\"", ""),
-                    'message': ', '.join(filter(None, (step_item.strip().replace("\"", "") for step_item in step_items[3:] if step_item.strip()))),
-                    'result': results[int(step_items[0])] if int(step_items[0]) in results else int(step_items[0])
-                }
-            ]
-
-    # Build list of errors
-    err_list = []
-    for step in steps:
-        if step['result'] == 'Failure' and len(step['message']) > 0:
-            err_list += [step['result'] + ': ' + step['message']]
-
-    # Check for error
-    if err_list:
-        err = '\n'.join(err_list)
+    return True, cache['steps'], cache.get('duration', 0.0)
 
-    # Return
-    return err, steps
+
+# ------------------------------------------------------------------------------
+def save_preflight_cache(cache_path, cache_key, steps, duration):
+    """
+    Caches the checks of a run for cache_key.  A cache that cannot be written
+    is not an error, preflight just runs again next time.
+    """
+
+    file_cache.save_cache(cache_path, {
+        'key': cache_key,
+        'time': time.time(),
+        'steps': steps,
+        'duration': duration
+    })
 
 
 # ------------------------------------------------------------------------------
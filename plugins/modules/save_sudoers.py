@@ -30,25 +30,100 @@ short_description: Saves the sudoers file on the controller node.
 version_added: '2.9'
 
 description: >
-    Saves the sudoers file on the controller node.
+    Saves the sudoers file on the controller node, or extracts the sudoers
+    files that have changed from an archive created by get_sudoers.  Files
+    whose content is already the same are not rewritten, other files are
+    replaced atomically.
 
 options:
     path:
         description:
-            - Path to the output file
+            - Path to the output file, or to the output directory when
+              I(archive) or I(records) is given
         type: str
         required: true
     content:
         description:
             - Content of the output file
+            - Mutually exclusive with I(archive) and I(records)
         type: str
-        required: true
+        required: false
+    encoding:
+        description:
+            - Encoding of I(content).  C(zlib) is zlib compressed and base64
+              encoded content as returned by get_sudoers with compress=true,
+              which is decompressed as a stream into the output file.
+        type: str
+        required: false
+        default: 'none'
+        choices: ['none', 'zlib']
+    size:
+        description:
+            - Size in bytes of the decoded I(content).  If the output file
+              already has this size and I(digest), I(content) is not even
+              decoded.
+        type: int
+        required: false
+    digest:
+        description:
+            - SHA-256 digest of the decoded I(content), which is verified
+              before the output file is replaced
+        type: str
+        required: false
+    archive:
+        description:
+            - Path to an archive of sudoers files created by get_sudoers with
+              output=archive.  Each member is extracted below I(path) unless
+              the file there already has the checksum in I(checksums).
+            - Mutually exclusive with I(content) and I(records)
+        type: str
+        required: false
+    checksums:
+        description:
+            - SHA-256 digest of each archived sudoers file keyed by its path,
+              as returned by get_sudoers in archive_checksums
+        type: dict
+        required: false
+        default: {}
+    records:
+        description:
+            - Complete sudoers files of many hosts to be saved in one go.  Each
+              record has a C(host), the C(path) of the main sudoers file on
+              that host and the C(content) of the complete sudoers file, which
+              is saved to I(path)/C(host)/C(path).  A record may also have the
+              C(encoding), C(size) and C(digest) of its content.
+            - The sudoersrecords filter builds the records from the
+              get_sudoers facts of the hosts in a play.
+            - Mutually exclusive with I(content) and I(archive)
+        type: list
+        elements: dict
+        required: false
+    workers:
+        description:
+            - Number of records saved in parallel
+        type: int
+        required: false
+        default: 8
+    inherit_owner:
+        description:
+            - Give each file saved from I(records) and the directories leading
+              to it the owner and group of the directory of its host
+        type: bool
+        required: false
+        default: false
     facts_key:
         description:
             - Ansible facts key
         type: str
         required: false
         default: 'save_sudoers'
+    profile:
+        description:
+            - Return the time spent in each phase of the module run, in
+              external tools and in the module itself, and the peak memory use
+        type: bool
+        required: false
+        default: false
 
 author:
     - Laszlo Nagy (laszlo.nagy@oneidentity.com)
@@ -60,6 +135,36 @@ EXAMPLES = """
     path: /tmp/1id/hostname/etc/sudoers
     content: "{{ sudoers_content }}"
   register: save_sudoers_result
+
+- name: Save compressed complete sudoers
+  save_sudoers:
+    path: /tmp/1id/hostname/etc/sudoers
+    content: "{{ get_sudoers_result.ansible_facts.get_sudoers.complete_sudoers }}"
+    encoding: "{{ get_sudoers_result.ansible_facts.get_sudoers.complete_sudoers_encoding }}"
+    size: "{{ get_sudoers_result.ansible_facts.get_sudoers.complete_sudoers_size }}"
+    digest: "{{ get_sudoers_result.ansible_facts.get_sudoers.complete_sudoers_digest }}"
+  register: save_sudoers_result
+
+- name: Extract changed sudoers files
+  save_sudoers:
+    path: /tmp/1id/hostname
+    archive: /tmp/1id/hostname/.sudoers.tar.gz
+    checksums: "{{ get_sudoers_result.ansible_facts.get_sudoers.archive_checksums }}"
+  register: save_sudoers_result
+
+- name: Save complete sudoers of all hosts
+  save_sudoers:
+    path: /tmp/1id
+    records: "{{ hostvars | oneidentity.privilege_manager.sudoersrecords(ansible_play_hosts) }}"
+    inherit_owner: true
+  run_once: true
+  register: save_sudoers_result
+  failed_when: false
+
+- name: Fail the hosts whose complete sudoers could not be saved
+  fail:
+    msg: "{{ save_sudoers_result.ansible_facts.save_sudoers.results[inventory_hostname].msg }}"
+  when: save_sudoers_result.ansible_facts.save_sudoers.results[inventory_hostname].failed | default(false)
 """
 
 RETURN = """
@@ -85,9 +190,33 @@ ansible_facts:
             type: dict
             returned: always
         dest:
-            description: Path to complete main sudoers file
+            description: Path to complete main sudoers file, or to the output directory when archive or records is given
             type: str
             returned: always
+        extracted:
+            description: Paths of the archived sudoers files that have been extracted
+            type: list of str
+            returned: when archive is given
+        unchanged:
+            description: Paths of the archived sudoers files that were already up to date
+            type: list of str
+            returned: when archive is given
+        results:
+            description: >
+                Result of each record by host: destination path (dest),
+                changed, failed and error message (msg).  A record that failed
+                does not fail the other records, the error messages of all of
+                them are also joined in msg.
+            type: dict
+            returned: when records is given
+        profile:
+            description: >
+                Timings of the module run: total, phases (extract or write, and
+                result), subprocess (count, wall, user, sys and runs), wrapper
+                (time outside external tools), max_rss_kb and
+                children_max_rss_kb
+            type: dict
+            returned: when profile is true
 """
 
 
@@ -97,16 +226,35 @@ ansible_facts:
 
 from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils.common.text.converters import to_bytes
-from ansible.utils.path import makedirs_safe
+import base64
+import errno
+import hashlib
+from multiprocessing.pool import ThreadPool
 import os
+import tarfile
+import tempfile
 import traceback
+import zlib
+import ansible_collections.oneidentity.privilege_manager.plugins.module_utils.profiling as profiling
 
 # ------------------------------------------------------------------------------
 # Constants
 # ------------------------------------------------------------------------------
 
-# Arg defaults
+# Arg choices and defaults
+ENCODING_DEFAULT = 'none'
+ENCODING_CHOICES = ['none', 'zlib']
+WORKERS_DEFAULT = 8
+INHERIT_OWNER_DEFAULT = False
 FACTS_KEY_DEFAULT = 'save_sudoers'
+PROFILE_DEFAULT = False
+
+# Size of the chunks in which existing files are hashed and content is
+# written
+READ_CHUNK_SIZE = 65536
+
+# Number of base64 characters decoded at a time, a multiple of 4
+DECODE_CHUNK_SIZE = 4 * 16384
 
 
 # ------------------------------------------------------------------------------
@@ -127,12 +275,55 @@ def run_module():
             },
             'content': {
                 'type': 'str',
-                'required': True
+                'required': False
+            },
+            'encoding': {
+                'type': 'str',
+                'required': False,
+                'choices': ENCODING_CHOICES,
+                'default': ENCODING_DEFAULT
+            },
+            'size': {
+                'type': 'int',
+                'required': False
+            },
+            'digest': {
+                'type': 'str',
+                'required': False
+            },
+            'archive': {
+                'type': 'str',
+                'required': False
+            },
+            'checksums': {
+                'type': 'dict',
+                'required': False,
+                'default': {}
+            },
+            'records': {
+                'type': 'list',
+                'elements': 'dict',
+                'required': False
+            },
+            'workers': {
+                'type': 'int',
+                'required': False,
+                'default': WORKERS_DEFAULT
+            },
+            'inherit_owner': {
+                'type': 'bool',
+                'required': False,
+                'default': INHERIT_OWNER_DEFAULT
             },
             'facts_key': {
                 'type': 'str',
                 'required': False,
                 'default': FACTS_KEY_DEFAULT
+            },
+            'profile': {
+                'type': 'bool',
+                'required': False,
+                'default': PROFILE_DEFAULT
             }
         }
 
@@ -146,6 +337,8 @@ def run_module():
     # Lean on boilerplate code in AnsibleModule class
     module = AnsibleModule(
         argument_spec=module_args,
+        required_one_of=[['content', 'archive', 'records']],
+        mutually_exclusive=[['content', 'archive', 'records']],
         supports_check_mode=True
     )
 
@@ -170,41 +363,418 @@ def run_normal(params, result):
 
     # Return data
     err = None
+    changed = False
+    extracted = []
+    unchanged = []
+    results = {}
 
     # Parameters
     sudoers_path = params['path']
     sudoers_content = params['content']
+    encoding = params['encoding'] if params['encoding'] else ENCODING_DEFAULT
+    size = params['size']
+    digest = params['digest']
+    archive = params['archive']
+    checksums = params['checksums'] if params['checksums'] else {}
+    records = params['records']
+    workers = params['workers'] if params['workers'] else WORKERS_DEFAULT
+    inherit_owner = params['inherit_owner']
     facts_key = params['facts_key'] if params['facts_key'] else FACTS_KEY_DEFAULT
+    profile = profiling.start_profile(params['profile'])
 
     try:
         sudoers_path = os.path.normpath(sudoers_path)
 
-        # create the containing directories, if needed
-        makedirs_safe(os.path.dirname(sudoers_path))
-
-        f = open(to_bytes(sudoers_path, errors='surrogate_or_strict'), 'wb')
-        f.write(to_bytes(sudoers_content, errors='surrogate_or_strict'))
-        f.close()
+        if archive:
+            with profiling.profile_phase(profile, 'extract'):
+                err, extracted, unchanged = extract_sudoers(archive, sudoers_path, checksums)
+            changed = len(extracted) > 0
+        elif records is not None:
+            with profiling.profile_phase(profile, 'write'):
+                err, record_results = save_sudoers_records(sudoers_path, records, workers, inherit_owner)
+            results = dict((r['host'], r) for r in record_results)
+            changed = any(r['changed'] for r in record_results)
+        else:
+            with profiling.profile_phase(profile, 'write'):
+                err, changed = save_sudoers_content(sudoers_path, sudoers_content, encoding, size, digest)
 
     except Exception:
         tb = traceback.format_exc()
         err = str(tb)
 
-    # Build result
-    result['changed'] =  True if err is None else False
-    result['failed'] = err is not None
-    result['msg'] = err if err is not None else ''
+    # Every record of a batch gets a result, records not saved because of an
+    # error of the whole batch fail with that error
+    if records is not None and err is not None:
+        for record in records:
+            host = str(record.get('host', ''))
+            if host not in results:
+                results[host] = {'host': host, 'dest': '', 'changed': False, 'failed': True, 'msg': err}
 
-    # Create ansible_facts data
-    result_facts = result.copy()
-    result_facts['params'] = params
-    result_facts['dest'] = sudoers_path
-    result['ansible_facts'] = {facts_key: result_facts}
+    # Build result
+    with profiling.profile_phase(profile, 'result'):
+        result['changed'] = changed
+        result['failed'] = err is not None
+        result['msg'] = err if err is not None else ''
+
+        # Create ansible_facts data
+        result_facts = result.copy()
+        result_facts['params'] = params
+        result_facts['dest'] = sudoers_path
+        if archive:
+            result_facts['extracted'] = extracted
+            result_facts['unchanged'] = unchanged
+        if records is not None:
+            # Do not return the content of all sudoers files again
+            result_facts['params'] = dict(params, records=[
+                {'host': r.get('host'), 'path': r.get('path')} for r in records])
+            result_facts['results'] = results
+        result['ansible_facts'] = {facts_key: result_facts}
+
+    if profile is not None:
+        result_facts['profile'] = profiling.profile_report(profile)
 
     # Return
     return err, result
 
 
+# ------------------------------------------------------------------------------
+def save_sudoers_content(sudoers_path, content, encoding, size, digest):
+    """
+    Decodes content and writes it to sudoers_path unless the file already has
+    the same content.  content is decoded (and decompressed) in chunks while
+    it is written, so the decoded content is never held in memory as a whole.
+    Returns an error message or None and whether the file has been written.
+    """
+
+    if encoding == 'zlib':
+        chunks = decompress_chunks(decode_chunks(content))
+    else:
+        chunks = encode_chunks(content)
+
+    return write_sudoers_stream(sudoers_path, chunks, size, digest)
+
+
+# ------------------------------------------------------------------------------
+def encode_chunks(content):
+    """
+    Yields content encoded to bytes in chunks
+    """
+
+    for i in range(0, len(content), READ_CHUNK_SIZE):
+        yield to_bytes(content[i:i + READ_CHUNK_SIZE], errors='surrogate_or_strict')
+
+
+# ------------------------------------------------------------------------------
+def decode_chunks(content):
+    """
+    Yields the base64 decoded data of content in chunks, content must not be
+    wrapped into lines (as returned by get_sudoers)
+    """
+
+    # Each 4 base64 characters decode to 3 bytes on their own
+    for i in range(0, len(content), DECODE_CHUNK_SIZE):
+        yield base64.b64decode(content[i:i + DECODE_CHUNK_SIZE])
+
+
+# ------------------------------------------------------------------------------
+def decompress_chunks(compressed_chunks):
+    """
+    Yields the decompressed data of compressed_chunks in chunks of at most
+    READ_CHUNK_SIZE bytes, however well the data is compressed
+    """
+
+    decompressor = zlib.decompressobj()
+    for compressed in compressed_chunks:
+        while compressed:
+            chunk = decompressor.decompress(compressed, READ_CHUNK_SIZE)
+            compressed = decompressor.unconsumed_tail
+            if chunk:
+                yield chunk
+    yield decompressor.flush()
+
+
+# ------------------------------------------------------------------------------
+def write_sudoers(sudoers_path, data):
+    """
+    Writes data to sudoers_path unless the file already has the same content.
+
+    Returns True if the file has been written.
+    """
+
+    err, changed = write_sudoers_stream(
+        sudoers_path, [data], len(data), hashlib.sha256(data).hexdigest())
+
+    return changed
+
+
+# ------------------------------------------------------------------------------
+def write_sudoers_stream(sudoers_path, chunks, size, digest):
+    """
+    Writes the chunks of data to sudoers_path unless the file already has the
+    given size and SHA-256 digest.  The chunks are written to a temporary file
+    in the same directory which then replaces sudoers_path, so readers never
+    see a partially written file.  The file is not replaced if the chunks do
+    not add up to size and digest.  Without size or digest, the file is only
+    compared with the chunks once they have been written.
+
+    Returns an error message or None and whether the file has been written.
+    """
+
+    b_path = to_bytes(sudoers_path, errors='surrogate_or_strict')
+
+    if size is not None and digest and file_matches(b_path, size, digest):
+        return None, False
+
+    # create the containing directories, if needed
+    b_dir = os.path.dirname(b_path)
+    if b_dir:
+        try:
+            os.makedirs(b_dir)
+        except OSError as e:
+            if e.errno != errno.EEXIST or not os.path.isdir(b_dir):
+                raise
+
+    # Keep the permissions of the file being replaced, new files get the same
+    # permissions as with open(), which applies the umask
+    try:
+        mode = os.stat(b_path).st_mode & 0o7777
+    except OSError:
+        mode = 0o666 & ~get_umask()
+
+    fd, b_tmp_path = tempfile.mkstemp(dir=b_dir if b_dir else None,
+        prefix=b'.' + os.path.basename(b_path) + b'.')
+    try:
+        written_size = 0
+        written_digest = hashlib.sha256()
+        f = os.fdopen(fd, 'wb')
+        try:
+            for chunk in chunks:
+                f.write(chunk)
+                written_size += len(chunk)
+                written_digest.update(chunk)
+        finally:
+            f.close()
+
+        if size is None or not digest:
+            if file_matches(b_path, written_size, written_digest.hexdigest()):
+                os.remove(b_tmp_path)
+                return None, False
+
+        elif written_size != size or written_digest.hexdigest() != digest:
+            os.remove(b_tmp_path)
+            return 'Size or digest of the content does not match: ' + sudoers_path, False
+
+        os.chmod(b_tmp_path, mode)
+        os.rename(b_tmp_path, b_path)
+
+    except Exception:
+        os.remove(b_tmp_path)
+        raise
+
+    return None, True
+
+
+# ------------------------------------------------------------------------------
+def get_umask():
+    """
+    Returns the umask of the process.  It is read from /proc where available,
+    as os.umask() can only read it by setting it, which affects the files that
+    other save workers create meanwhile.  Elsewhere the umask is set to 077
+    for that moment, so those files get fewer permissions rather than more.
+    """
+
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('Umask:'):
+                    return int(line.split()[1], 8)
+    except (IOError, OSError, ValueError, IndexError):
+        pass
+
+    umask = os.umask(0o077)
+    os.umask(umask)
+    return umask
+
+
+# ------------------------------------------------------------------------------
+def file_matches(path, size, digest):
+    """
+    Returns True if the file at path exists and has the given size and SHA-256
+    digest.  The size is checked first so most changed files are not read.
+    """
+
+    try:
+        if os.stat(path).st_size != size:
+            return False
+    except OSError:
+        return False
+
+    return file_digest(path) == digest
+
+
+# ------------------------------------------------------------------------------
+def save_sudoers_records(dest_dir, records, workers, inherit_owner):
+    """
+    Saves the complete sudoers file of each record below dest_dir using a pool
+    of workers threads.  Returns the result of each record in the same order,
+    and the error messages of the failed records joined as err.
+    """
+
+    def save(record):
+        return save_sudoers_record(dest_dir, record, inherit_owner)
+
+    if workers > 1 and len(records) > 1:
+        pool = ThreadPool(min(workers, len(records)))
+        try:
+            results = pool.map(save, records)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [save(record) for record in records]
+
+    for r in results:
+        r['failed'] = bool(r['msg'])
+    errors = [r['host'] + ': ' + r['msg'] for r in results if r['msg']]
+    err = '\n'.join(errors) if errors else None
+
+    # Return
+    return err, results
+
+
+# ------------------------------------------------------------------------------
+def save_sudoers_record(dest_dir, record, inherit_owner):
+    """
+    Saves the complete sudoers file of a record to dest_dir/host/path
+    """
+
+    host = str(record.get('host', ''))
+    result = {
+        'host': host,
+        'dest': '',
+        'changed': False,
+        'failed': False,
+        'msg': ''
+    }
+
+    try:
+        if not host or '/' in host or host in ('.', '..'):
+            result['msg'] = 'Invalid host name'
+            return result
+        if 'path' not in record or 'content' not in record:
+            result['msg'] = 'Record has no path or content'
+            return result
+
+        host_dir = os.path.join(dest_dir, host)
+        sudoers_path = os.path.normpath(host_dir + '/' + record['path'])
+        if not sudoers_path.startswith(host_dir + '/'):
+            result['msg'] = 'Unsafe path: ' + record['path']
+            return result
+        result['dest'] = sudoers_path
+
+        err, result['changed'] = save_sudoers_content(
+            sudoers_path,
+            record['content'],
+            record.get('encoding') or ENCODING_DEFAULT,
+            record.get('size'),
+            record.get('digest'))
+        if err:
+            result['msg'] = err
+            return result
+
+        if inherit_owner:
+            inherit_sudoers_owner(host_dir, sudoers_path)
+
+    except Exception:
+        result['msg'] = traceback.format_exc()
+
+    return result
+
+
+# ------------------------------------------------------------------------------
+def inherit_sudoers_owner(owner_dir, sudoers_path):
+    """
+    Gives sudoers_path and the directories between it and owner_dir the owner
+    and group of owner_dir, like chown --reference=owner_dir but without
+    walking the whole tree.
+    """
+
+    st = os.stat(owner_dir)
+    path = sudoers_path
+    while path != owner_dir and path.startswith(owner_dir + '/'):
+        path_st = os.lstat(path)
+        if (path_st.st_uid, path_st.st_gid) != (st.st_uid, st.st_gid):
+            os.lchown(path, st.st_uid, st.st_gid)
+        path = os.path.dirname(path)
+
+
+# ------------------------------------------------------------------------------
+def extract_sudoers(archive, dest_dir, checksums):
+    """
+    Extracts the regular files of archive below dest_dir.  Files in dest_dir
+    whose SHA-256 digest already matches the checksum of the member in
+    checksums are left alone.
+    """
+
+    # Return values
+    err = None
+    extracted = []
+    unchanged = []
+
+    tar = tarfile.open(archive, 'r:*')
+    try:
+        for member in tar:
+            if not member.isfile():
+                continue
+
+            # Never write outside of dest_dir
+            name = os.path.normpath(member.name).lstrip('/')
+            if name == '..' or name.startswith('../'):
+                err = 'Unsafe path in archive ' + archive + ': ' + member.name
+                break
+            sudoers_path = os.path.join(dest_dir, name)
+
+            checksum = checksums.get('/' + name)
+            if checksum and file_digest(sudoers_path) == checksum:
+                unchanged.append('/' + name)
+                continue
+
+            data = tar.extractfile(member).read()
+            if checksum and hashlib.sha256(data).hexdigest() != checksum:
+                err = 'Checksum mismatch in archive ' + archive + ': ' + member.name
+                break
+
+            if write_sudoers(sudoers_path, data):
+                extracted.append('/' + name)
+            else:
+                unchanged.append('/' + name)
+    finally:
+        tar.close()
+
+    # Return
+    return err, extracted, unchanged
+
+
+# ------------------------------------------------------------------------------
+def file_digest(path):
+    """
+    Returns the SHA-256 digest of a file or None if it cannot be read
+    """
+
+    digest = hashlib.sha256()
+    try:
+        f = open(to_bytes(path, errors='surrogate_or_strict'), 'rb')
+    except (IOError, OSError):
+        return None
+    try:
+        for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    finally:
+        f.close()
+
+    return digest.hexdigest()
+
+
 # ------------------------------------------------------------------------------
 def main():
     """
@@ -55,6 +55,27 @@ options:
         description:
             - Software directory
         required: true
+    checksum:
+        description:
+            - Keys of the packages (e.g. pmpreflight) whose SHA-1 checksum is
+              returned, so that the package only needs to be copied to a host
+              that does not have it yet
+        type: list
+        elements: str
+        required: false
+        default: []
+    cache_path:
+        description:
+            - Path of a cache file that keeps the checksums together with the
+              stat key of each package, so that a package is only read again
+              after it has been replaced.  The module usually runs without
+              become on the software host, so the default is in the home
+              directory of the user.  The cache is ignored unless the file
+              and its directory are owned by that user and writable by no
+              one else.  An empty string disables the cache.
+        type: str
+        required: false
+        default: '~/.cache/1id/software_pkgs_cache.json'
     facts:
         description:
             - Generate Ansible facts?
@@ -67,6 +88,13 @@ options:
         type: str
         required: false
         default: 'software_pkgs'
+    profile:
+        description:
+            - Return the time spent in each phase of the module run, in
+              external tools and in the module itself, and the peak memory use
+        type: bool
+        required: false
+        default: false
 
 author:
     - Mark Stillings (mark.stillings@oneidentity.com)
@@ -81,6 +109,16 @@ EXAMPLES = """
     arch: amd64
     path: /var/tmp/privilege_manager/sw
   register: software_pkgs_result
+
+- name: Return the checksum of pmpreflight
+  software_pkgs:
+    mode: sudo
+    sys: linux
+    dist: debian
+    arch: amd64
+    path: /var/tmp/privilege_manager/sw
+    checksum: [pmpreflight]
+  register: software_pkgs_result
 """
 
 RETURN = """
@@ -89,9 +127,18 @@ params:
     type: dict
     returned: always
 packages:
-    description: The discovered packages and versions in supplied path
+    description: >
+        The discovered packages and versions in supplied path.  The packages
+        in checksum also have the SHA-1 checksum of the package file.
     type: dict
     returned: always
+profile:
+    description: >
+        Timings of the module run: total, phases (scan, checksum and result),
+        subprocess (count, wall, user, sys and runs), wrapper (time outside
+        external tools), max_rss_kb and children_max_rss_kb
+    type: dict
+    returned: when profile is true
 ansible_facts:
     description: All return data is placed in Ansible facts
     type: dict
@@ -128,7 +175,10 @@ from ansible.module_utils.basic import AnsibleModule
 import os
 import traceback
 import glob
+import hashlib
 import re
+import ansible_collections.oneidentity.privilege_manager.plugins.module_utils.file_cache as file_cache
+import ansible_collections.oneidentity.privilege_manager.plugins.module_utils.profiling as profiling
 
 
 # ------------------------------------------------------------------------------
@@ -136,8 +186,11 @@ import re
 # ------------------------------------------------------------------------------
 
 # Arg choices and defaults
+CHECKSUM_DEFAULT = []
+CACHE_PATH_DEFAULT = '~/.cache/1id/software_pkgs_cache.json'
 FACTS_DEFAULT = False
 FACTS_KEY_DEFAULT = 'sas_software_pkgs'
+PROFILE_DEFAULT = False
 
 # Package paths for all supported systems and architectures
 PKG_PATHS = {
@@ -207,6 +260,9 @@ PKG_KEYS = {
     'sudo_plugin': 'plugin'
 }
 
+# Size of the chunks in which a package is read to compute its checksum
+CHECKSUM_CHUNK_SIZE = 1024 * 1024
+
 
 # ------------------------------------------------------------------------------
 # Functions
@@ -241,6 +297,17 @@ def run_module():
                 'type': 'str',
                 'required': True
             },
+            'checksum': {
+                'type': 'list',
+                'elements': 'str',
+                'required': False,
+                'default': CHECKSUM_DEFAULT
+            },
+            'cache_path': {
+                'type': 'str',
+                'required': False,
+                'default': CACHE_PATH_DEFAULT
+            },
             'facts': {
                 'type': 'bool',
                 'required': False,
@@ -250,6 +317,11 @@ def run_module():
                 'type': 'str',
                 'required': False,
                 'default': FACTS_KEY_DEFAULT
+            },
+            'profile': {
+                'type': 'bool',
+                'required': False,
+                'default': PROFILE_DEFAULT
             }
         }
 
@@ -292,6 +364,7 @@ def run_normal(params, result):
     # Return data
     err = None
     packages = {}
+    profile = profiling.start_profile(params['profile'])
 
     # Parameters
     mode = params['mode'].lower()
@@ -299,6 +372,8 @@ def run_normal(params, result):
     dist = params['dist'].lower()
     arch = params['arch'].lower()
     path = params['path']
+    checksum = params['checksum'] if params['checksum'] else []
+    cache_path = os.path.expanduser(params['cache_path']) if params['cache_path'] else ''
     facts = params['facts']
     facts_key = params['facts_key'] if params['facts_key'] else FACTS_KEY_DEFAULT
 
@@ -313,26 +388,35 @@ def run_normal(params, result):
 
             # Find packages
             if err is None:
-                for sub_dir in sub_dirs:
-                    err, p = find_packages(path, sub_dir, sys, dist, arch)
-                    if err is None:
-                        packages.update(p)
-                    else:
-                        break
+                with profiling.profile_phase(profile, 'scan'):
+                    for sub_dir in sub_dirs:
+                        err, p = find_packages(path, sub_dir, sys, dist, arch)
+                        if err is None:
+                            packages.update(p)
+                        else:
+                            break
 
                 if not err and not packages:
                     err = 'No packages found for sys=' + sys + ', dist=' + dist + ', arch=' + arch
 
+            # Checksum packages
+            if err is None and checksum:
+                with profiling.profile_phase(profile, 'checksum'):
+                    checksum_packages(packages, checksum, cache_path)
+
     except Exception:
         tb = traceback.format_exc()
         err = str(tb)
 
     # Build result
-    result['changed'] = False   # Never makes any changes to the host
-    result['failed'] = err is not None
-    result['msg'] = err if err is not None else ''
-    result['params'] = params
-    result['packages'] = packages
+    with profiling.profile_phase(profile, 'result'):
+        result['changed'] = False   # Never makes any changes to the host
+        result['failed'] = err is not None
+        result['msg'] = err if err is not None else ''
+        result['params'] = params
+        result['packages'] = packages
+    if profile is not None:
+        result['profile'] = profiling.profile_report(profile)
 
     # Create ansible_facts data
     if facts:
@@ -559,6 +643,55 @@ def find_preflight(path):
     return preflight
 
 
+# ------------------------------------------------------------------------------
+def checksum_packages(packages, keys, cache_path):
+    """
+    Adds the SHA-1 checksum of the file of each package in keys to the package.
+    Checksums are kept in cache_path by package path together with the stat
+    key of the package, so that each package is only read once however many
+    hosts it is checked for.
+    """
+
+    cache = file_cache.load_cache(cache_path)
+    cache_changed = False
+
+    for key in keys:
+        package = packages.get(key)
+        if not package or not package['path']:
+            continue
+
+        pkg_path = package['path']
+        pkg_key = file_cache.stat_key(pkg_path)
+        entry = cache.get(pkg_path)
+        if pkg_key is not None and isinstance(entry, dict) and entry.get('key') == pkg_key:
+            package['checksum'] = entry.get('checksum', '')
+            continue
+
+        package['checksum'] = checksum_file(pkg_path)
+        cache[pkg_path] = {'key': pkg_key, 'checksum': package['checksum']}
+        cache_changed = True
+
+    # A cache that cannot be written is not an error, the packages are just
+    # read again next time
+    if cache_changed:
+        file_cache.save_cache(cache_path, cache)
+
+
+# ------------------------------------------------------------------------------
+def checksum_file(path):
+    """
+    Returns the SHA-1 checksum of the file at path, the same checksum that the
+    stat module returns by default
+    """
+
+    checksum = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHECKSUM_CHUNK_SIZE), b''):
+            checksum.update(chunk)
+
+    return checksum.hexdigest()
+
+
 # ------------------------------------------------------------------------------
 def main():
     """
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# Copyright (c) 2022, One Identity LLC
+# File: test_process.py
+# Desc: Unit tests for the process module utils.
+# Auth: Laszlo Nagy
+# Note: Run with ansible-test units, or with pytest and the collection on
+#       the Python path.
+# ------------------------------------------------------------------------------
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import sys
+
+from ansible_collections.oneidentity.privilege_manager.plugins.module_utils import process
+
+
+# Prints lines of 100 bytes, 4 MiB in total
+ROWS = 41944
+PRINT_ROWS = 'import sys\nfor i in range(%d):\n    sys.stdout.write("%%099d\\n" %% i)\n' % ROWS
+
+
+def test_output_past_limit_is_an_error():
+    err, rc, stdout, stderr, duration = process.run_process([sys.executable, '-c', PRINT_ROWS])
+
+    assert err == sys.executable.rsplit('/', 1)[-1] + ' output exceeded ' + str(process.MAX_OUTPUT_DEFAULT) + ' bytes'
+    assert rc is None
+    assert len(stdout) == process.MAX_OUTPUT_DEFAULT
+
+
+def test_output_without_limit_is_complete():
+    err, rc, stdout, stderr, duration = process.run_process([sys.executable, '-c', PRINT_ROWS], max_output=0)
+
+    assert err is None
+    assert rc == 0
+    assert len(stdout) == ROWS * 100
+    assert stdout.splitlines()[-1] == '%099d' % (ROWS - 1)
+
+
+def test_line_callback_gets_output_past_limit():
+    lines = []
+    err, rc, stdout, stderr, duration = process.run_process([sys.executable, '-c', PRINT_ROWS],
+        line_callback=lambda line, line_time: lines.append(line))
+
+    assert err is None
+    assert rc == 0
+    assert len(lines) == ROWS
+    assert len(stdout) == process.MAX_OUTPUT_DEFAULT